@@ -0,0 +1,155 @@
+import bisect
+import re
+import threading
+import time
+
+from storage import ThreadLocalSQLite
+
+# --- 價格警示指令：「2330 > 1100」、「0056 跌破 35」 ---
+# 警示一律在價格達到門檻（含等於）時觸發：> / < 與 >= / <= 同義，回覆時以 ≥ / ≤ 呈現
+ALERT_PATTERN = re.compile(r"^([0-9]{4,6}[A-Z]?)\s*(>=|<=|>|<|≥|≤|突破|漲破|高於|跌破|低於)\s*(\d+(?:\.\d+)?)$")
+ABOVE_WORDS = {">", ">=", "≥", "突破", "漲破", "高於"}
+
+def parse_alert(text):
+    m = ALERT_PATTERN.match(text.strip())
+    if not m:
+        return None
+    code, op, threshold = m.groups()
+    return code, "above" if op in ABOVE_WORDS else "below", float(threshold)
+
+def describe(direction, threshold):
+    return f"{'≥' if direction == 'above' else '≤'} {threshold:g}"
+
+# --- 警示儲存（SQLite），所有 worker 共用 ---
+class AlertStore:
+    def __init__(self, path):
+        self.path = path
+        self._conn = ThreadLocalSQLite(path)
+        self._conn().executescript("""
+            CREATE TABLE IF NOT EXISTS alerts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                stock_id TEXT NOT NULL,
+                direction TEXT NOT NULL,
+                threshold REAL NOT NULL,
+                status TEXT NOT NULL DEFAULT 'active',
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS alerts_user ON alerts (user_id, status);
+            CREATE INDEX IF NOT EXISTS alerts_updated ON alerts (updated_at);
+        """)
+
+    def add(self, user_id, code, direction, threshold):
+        cur = self._conn().execute(
+            "INSERT INTO alerts (user_id, stock_id, direction, threshold, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (user_id, code, direction, threshold, time.time()),
+        )
+        return cur.lastrowid
+
+    def cancel(self, user_id, alert_id):
+        cur = self._conn().execute(
+            "UPDATE alerts SET status = 'cancelled', updated_at = ? WHERE id = ? AND user_id = ? AND status = 'active'",
+            (time.time(), alert_id, user_id),
+        )
+        return cur.rowcount > 0
+
+    def mark_fired(self, alert_ids):
+        now = time.time()
+        self._conn().executemany(
+            "UPDATE alerts SET status = 'fired', updated_at = ? WHERE id = ?", [(now, i) for i in alert_ids]
+        )
+
+    def active_for_user(self, user_id):
+        return self._conn().execute(
+            "SELECT id, stock_id, direction, threshold FROM alerts WHERE user_id = ? AND status = 'active' ORDER BY id",
+            (user_id,),
+        ).fetchall()
+
+    def changed_since(self, since):
+        return self._conn().execute(
+            "SELECT id, user_id, stock_id, direction, threshold, status, updated_at FROM alerts WHERE updated_at >= ?",
+            (since,),
+        ).fetchall()
+
+# --- 警示引擎：每檔依門檻排序，價格更新時只檢查被跨越的區間 ---
+class AlertEngine:
+    def __init__(self, store):
+        self.store = store
+        self._above = {}  # code -> 排序過的 [(門檻, id)]，價格由下往上穿越時觸發
+        self._below = {}  # code -> 排序過的 [(門檻, id)]，價格由上往下穿越時觸發
+        self._alerts = {}  # id -> (user_id, code, direction, threshold)
+        self._new = set()  # 剛載入、尚未和目前價格比對過的警示
+        self._last_price = {}
+        self._synced_at = 0
+        self._lock = threading.Lock()
+
+    def _side(self, code, direction):
+        book = self._above if direction == "above" else self._below
+        return book.setdefault(code, [])
+
+    def _remove(self, alert_id):
+        alert = self._alerts.pop(alert_id, None)
+        self._new.discard(alert_id)
+        if alert is None:
+            return
+        _, code, direction, threshold = alert
+        side = self._side(code, direction)
+        i = bisect.bisect_left(side, (threshold, alert_id))
+        if i < len(side) and side[i] == (threshold, alert_id):
+            side.pop(i)
+
+    # 只讀取上次同步後有變動的警示（新增、取消、已觸發）
+    def sync(self):
+        with self._lock:
+            rows = self.store.changed_since(self._synced_at)
+            for alert_id, user_id, code, direction, threshold, status, updated_at in rows:
+                self._synced_at = max(self._synced_at, updated_at)
+                if status != "active":
+                    self._remove(alert_id)
+                elif alert_id not in self._alerts:
+                    self._alerts[alert_id] = (user_id, code, direction, threshold)
+                    bisect.insort(self._side(code, direction), (threshold, alert_id))
+                    self._new.add(alert_id)
+
+    def codes(self):
+        return sorted({alert[1] for alert in self._alerts.values()})
+
+    def _crossed(self, code, old, new):
+        fired = []
+        above = self._above.get(code, [])
+        below = self._below.get(code, [])
+        if old is None or new > old:
+            lo = 0 if old is None else bisect.bisect_right(above, (old, float("inf")))
+            hi = bisect.bisect_right(above, (new, float("inf")))
+            fired += [alert_id for _, alert_id in above[lo:hi]]
+        if old is None or new < old:
+            lo = bisect.bisect_left(below, (new, float("-inf")))
+            hi = len(below) if old is None else bisect.bisect_left(below, (old, float("-inf")))
+            fired += [alert_id for _, alert_id in below[lo:hi]]
+        return fired
+
+    # prices 為 {代碼: 最新價格}；回傳這次新觸發的 [(user_id, code, direction, threshold, price)]
+    def evaluate(self, prices):
+        self.sync()
+        with self._lock:
+            fired = set()
+            for code, price in prices.items():
+                fired.update(self._crossed(code, self._last_price.get(code), price))
+                self._last_price[code] = price
+            # 新設定的警示若條件已經成立，也立即觸發
+            for alert_id in list(self._new):
+                _, code, direction, threshold = self._alerts[alert_id]
+                price = self._last_price.get(code)
+                if price is None:
+                    continue
+                self._new.discard(alert_id)
+                if (direction == "above" and price >= threshold) or (direction == "below" and price <= threshold):
+                    fired.add(alert_id)
+            results = []
+            for alert_id in sorted(fired):
+                user_id, code, direction, threshold = self._alerts[alert_id]
+                results.append((user_id, code, direction, threshold, self._last_price[code]))
+                self._remove(alert_id)
+        if fired:
+            self.store.mark_fired(sorted(fired))
+        return results
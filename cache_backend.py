@@ -0,0 +1,88 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from storage import ThreadLocalSQLite
+
+# --- 快取後端介面：值須可轉為 JSON，ttl 以秒為單位 ---
+class CacheBackend:
+    def get_many(self, keys):
+        raise NotImplementedError
+
+    def set_many(self, items, ttl):
+        raise NotImplementedError
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def set(self, key, value, ttl):
+        self.set_many({key: value}, ttl)
+
+# --- 單一行程記憶體快取（LRU） ---
+class MemoryBackend(CacheBackend):
+    def __init__(self, maxsize=2048):
+        self.maxsize = maxsize
+        self._data = OrderedDict()  # key -> (到期時間, value)
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        now = time.time()
+        found = {}
+        with self._lock:
+            for key in keys:
+                hit = self._data.get(key)
+                if hit and hit[0] > now:
+                    self._data.move_to_end(key)
+                    found[key] = hit[1]
+        return found
+
+    def set_many(self, items, ttl):
+        expires_at = time.time() + ttl
+        with self._lock:
+            for key, value in items.items():
+                self._data[key] = (expires_at, value)
+                self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+# --- 同一台主機多個 worker 共用的 SQLite 快取（WAL 模式，讀寫互不阻塞） ---
+class SQLiteBackend(CacheBackend):
+    def __init__(self, path, purge_every=500):
+        self.path = path
+        self.purge_every = purge_every  # 每寫入幾次清一次過期資料
+        self._writes = 0
+        self._conn = ThreadLocalSQLite(path, pragmas=("journal_mode=WAL", "synchronous=NORMAL"))
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def get_many(self, keys):
+        keys = list(keys)
+        if not keys:
+            return {}
+        placeholders = ",".join("?" * len(keys))
+        rows = self._conn().execute(
+            f"SELECT key, value FROM cache WHERE key IN ({placeholders}) AND expires_at > ?",
+            (*keys, time.time()),
+        ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def set_many(self, items, ttl):
+        expires_at = time.time() + ttl
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                [(key, json.dumps(value, ensure_ascii=False), expires_at) for key, value in items.items()],
+            )
+        self._writes += 1
+        if self._writes % self.purge_every == 0:
+            conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+
+def make_backend(kind, path=None, maxsize=2048):
+    if kind == "sqlite":
+        return SQLiteBackend(path or os.path.join(os.getcwd(), "cache.sqlite3"))
+    return MemoryBackend(maxsize=maxsize)
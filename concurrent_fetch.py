@@ -0,0 +1,52 @@
+import math
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# --- 併發抓取：共用且有上限的執行緒池，每檔各自計時，逾時者以預設值呈現 ---
+class ConcurrentFetcher:
+    def __init__(self, max_workers=8, timeout=15):
+        self.max_workers = max_workers
+        self.timeout = timeout  # 單檔開始執行後最多等待的秒數
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fetch")
+
+    def map(self, fn, keys, default=None, timeout=None):
+        keys = list(keys)
+        if not keys:
+            return []
+        timeout = timeout or self.timeout
+        started = {}
+
+        def run(i, key):
+            started[i] = time.monotonic()
+            return fn(key)
+
+        futures = [self.executor.submit(run, i, key) for i, key in enumerate(keys)]
+        index = {f: i for i, f in enumerate(futures)}
+        # 排隊中的工作也要有上限：以「輪數 × 單檔逾時」作為整批的截止時間
+        rounds = math.ceil(len(keys) / self.max_workers)
+        batch_deadline = time.monotonic() + timeout * (rounds + 1)
+        pending = set(futures)
+
+        while pending:
+            now = time.monotonic()
+            if now >= batch_deadline:
+                break
+            expired = {f for f in pending if index[f] in started and now - started[index[f]] >= timeout}
+            pending -= expired
+            if not pending:
+                break
+            running = [started[index[f]] + timeout for f in pending if index[f] in started]
+            wake_at = min(running + [batch_deadline, now + timeout])
+            done, _ = wait(pending, timeout=max(0, wake_at - now), return_when=FIRST_COMPLETED)
+            pending -= done
+
+        results = []
+        for key, f in zip(keys, futures):
+            if f.done() and not f.cancelled() and f.exception() is None:
+                results.append(f.result())
+            else:
+                f.cancel()
+                if f.done() and not f.cancelled():
+                    print(f"{key} 抓取失敗: {f.exception()}")
+                results.append(default(key) if default else None)
+        return results
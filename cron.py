@@ -0,0 +1,177 @@
+import heapq
+import itertools
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+# --- cron 表示式：分 時 日 月 星期（0 或 7 為週日），支援 *、清單、範圍與間隔 ---
+FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+def _parse_field(field, low, high):
+    values = set()
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step = part.split("/")
+            step = int(step)
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (int(x) for x in part.split("-"))
+        else:
+            start = end = int(part)
+            if step != 1:
+                end = high
+        if start < low or end > high or start > end or step < 1:
+            raise ValueError(f"cron 欄位超出範圍: {field}")
+        values.update(range(start, end + 1, step))
+    return values
+
+class CronExpr:
+    def __init__(self, expr):
+        fields = expr.split()
+        if len(fields) != 5:
+            raise ValueError(f"cron 表示式需要 5 個欄位: {expr}")
+        self.expr = expr
+        parsed = [_parse_field(f, low, high) for f, (low, high) in zip(fields, FIELD_RANGES)]
+        self.minutes, self.hours, self.days, self.months, dows = parsed
+        self.dows = {d % 7 for d in dows}
+        self.dom_any = fields[2] == "*"
+        self.dow_any = fields[4] == "*"
+
+    def _day_matches(self, day):
+        dom = day.day in self.days
+        dow = (day.isoweekday() % 7) in self.dows
+        if self.dom_any or self.dow_any:
+            return dom and dow
+        return dom or dow  # 兩者都有限制時，符合其一即可（與標準 cron 相同）
+
+    # 傳入時區感知的 datetime，回傳嚴格晚於它的下一個觸發時間
+    def next_after(self, dt):
+        tz = dt.tzinfo
+        local = dt.replace(tzinfo=None, second=0, microsecond=0) + timedelta(minutes=1)
+        day = local.date()
+        for _ in range(366 * 5):
+            if day.month in self.months and self._day_matches(day):
+                first_day = day == local.date()
+                for hour in sorted(self.hours):
+                    if first_day and hour < local.hour:
+                        continue
+                    for minute in sorted(self.minutes):
+                        if first_day and hour == local.hour and minute < local.minute:
+                            continue
+                        naive = datetime.combine(day, datetime.min.time()).replace(hour=hour, minute=minute)
+                        return tz.localize(naive) if hasattr(tz, "localize") else naive.replace(tzinfo=tz)
+            day += timedelta(days=1)
+        raise ValueError(f"cron 表示式沒有可觸發的時間: {self.expr}")
+
+# --- 排程工作：func(fire_at) 於觸發時執行；prepare(fire_at) 於觸發前 lead 秒先執行 ---
+class Job:
+    def __init__(self, name, cron, func, trading_days_only=False, catch_up=0, prepare=None, lead=0):
+        self.name = name
+        self.cron = CronExpr(cron) if isinstance(cron, str) else cron
+        self.func = func
+        self.trading_days_only = trading_days_only
+        self.catch_up = catch_up  # 重啟後補跑錯過排程的容許秒數，0 表示不補跑
+        self.prepare = prepare
+        self.lead = lead
+
+# --- 排程器：以 heap 保存各工作的下次觸發時間，睡到最近的一個為止 ---
+class Scheduler:
+    def __init__(self, tz, calendar=None, state_path=None):
+        self.tz = tz
+        self.calendar = calendar
+        self.state_path = state_path  # 記錄各工作最後執行時間，供重啟後補跑
+        self._heap = []
+        self._seq = itertools.count()
+        self._wake = threading.Condition()
+        self._state = self._load_state()
+
+    def _load_state(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return {}
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"讀取排程狀態失敗: {e}")
+            return {}
+
+    def _save_state(self):
+        if not self.state_path:
+            return
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._state, f)
+        os.replace(tmp, self.state_path)
+
+    # heap 內容：(執行時間, 序號, 工作, 觸發時間, 是否為預先準備)
+    def _push(self, fire_at, job):
+        heapq.heappush(self._heap, (fire_at, next(self._seq), job, fire_at, False))
+        if job.prepare and job.lead:
+            prepare_at = fire_at - timedelta(seconds=job.lead)
+            if prepare_at > datetime.now(self.tz):
+                heapq.heappush(self._heap, (prepare_at, next(self._seq), job, fire_at, True))
+
+    def add_job(self, job):
+        now = datetime.now(self.tz)
+        fire_at = job.cron.next_after(now)
+        last_run = self._state.get(job.name)
+        if job.catch_up and last_run:
+            # 只補跑容許範圍內最近錯過的那一次
+            cursor = max(datetime.fromisoformat(last_run).astimezone(self.tz), now - timedelta(seconds=job.catch_up))
+            missed, candidate = None, job.cron.next_after(cursor)
+            while candidate <= now:
+                missed, candidate = candidate, job.cron.next_after(candidate)
+            if missed:
+                print(f"⏪ 補跑錯過的排程 {job.name}（{missed:%Y-%m-%d %H:%M}）")
+                fire_at = missed
+        with self._wake:
+            self._push(fire_at, job)
+            self._wake.notify()
+
+    def _should_run(self, job, fire_at):
+        if job.trading_days_only and self.calendar and not self.calendar.is_trading_day(fire_at.date()):
+            print(f"📅 {fire_at:%Y-%m-%d} 非交易日，略過 {job.name}")
+            return False
+        return True
+
+    def _prepare_job(self, job, fire_at):
+        try:
+            if self._should_run(job, fire_at):
+                job.prepare(fire_at)
+        except Exception as e:
+            print(f"排程 {job.name} 預先準備失敗: {e}")
+
+    def _run_job(self, job, fire_at):
+        try:
+            if self._should_run(job, fire_at):
+                print(f"⏰ 執行排程 {job.name}（{fire_at:%H:%M}）")
+                job.func(fire_at)
+        except Exception as e:
+            print(f"排程 {job.name} 執行失敗: {e}")
+        finally:
+            with self._wake:
+                self._state[job.name] = fire_at.isoformat()
+                try:
+                    self._save_state()
+                except Exception as e:
+                    print(f"寫入排程狀態失敗: {e}")
+
+    def run(self):
+        while True:
+            with self._wake:
+                while not self._heap:
+                    self._wake.wait()
+                run_at, _, job, fire_at, preparing = self._heap[0]
+                delay = (run_at - datetime.now(self.tz)).total_seconds()
+                if delay > 0:
+                    self._wake.wait(timeout=delay)  # 有新工作加入時會提早醒來重新檢查
+                    continue
+                heapq.heappop(self._heap)
+                if not preparing:
+                    # 工作在獨立執行緒執行，執行久也不會延誤下一格；補跑後從現在起算，不會連續重播
+                    self._push(job.cron.next_after(max(fire_at, datetime.now(self.tz))), job)
+            target = self._prepare_job if preparing else self._run_job
+            threading.Thread(target=target, args=(job, fire_at), daemon=True).start()
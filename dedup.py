@@ -0,0 +1,47 @@
+import threading
+import time
+from collections import OrderedDict
+
+# --- webhook 事件去重：以 webhookEventId 記錄已處理的事件 ---
+# 記憶體內為有上限的 TTL 集合；若提供共用快取後端，也會跨 worker 檢查
+class EventDeduplicator:
+    def __init__(self, ttl=10 * 60, maxsize=10000, backend=None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.backend = backend  # cache_backend.CacheBackend，可省略
+        self._seen = OrderedDict()  # event_id -> 到期時間
+        self._lock = threading.Lock()
+
+    def _seen_locally(self, event_id, now):
+        with self._lock:
+            while self._seen and next(iter(self._seen.values())) <= now:
+                self._seen.popitem(last=False)
+            if event_id in self._seen:
+                return True
+            self._seen[event_id] = now + self.ttl
+            while len(self._seen) > self.maxsize:
+                self._seen.popitem(last=False)
+            return False
+
+    def _seen_shared(self, event_id, redelivery):
+        key = f"webhook:{event_id}"
+        try:
+            # 首次送達的事件不可能在別處處理過，只需記錄；重送的事件才需查詢
+            if redelivery and self.backend.get(key):
+                return True
+            self.backend.set(key, 1, self.ttl)
+        except Exception as e:
+            print(f"事件去重後端失敗: {e}")
+        return False
+
+    # 第一次看到的事件回傳 False，重複的事件回傳 True
+    def is_duplicate(self, event_id, redelivery=True):
+        if not event_id:
+            return False
+        if self._seen_locally(event_id, time.time()):
+            return True
+        return self.backend is not None and self._seen_shared(event_id, redelivery)
+
+def is_redelivery(event):
+    context = getattr(event, "delivery_context", None)
+    return bool(context and getattr(context, "is_redelivery", False))
@@ -0,0 +1,139 @@
+import asyncio
+import threading
+import time
+import uuid
+
+from linebot.v3.messaging import (
+    AsyncApiClient,
+    AsyncMessagingApi,
+    Configuration,
+    Message,
+    MulticastRequest,
+    PushMessageRequest,
+    ReplyMessageRequest,
+    TextMessage,
+)
+
+from render import group_messages
+
+MULTICAST_LIMIT = 500  # LINE multicast 每次最多 500 位收件者
+
+def log_failure(label):
+    def callback(future):
+        if not future.cancelled() and future.exception() is not None:
+            print(f"{label} 失敗: {future.exception()}")
+    return callback
+
+# --- LINE 非同步發送：專用事件迴圈 + 共用 aiohttp 連線池，限制同時進行的請求數 ---
+# 同步程式呼叫 push/reply/multicast 會立即取得 concurrent.futures.Future，不需等待送達
+class LineSender:
+    def __init__(self, access_token, max_in_flight=16, timeout=10):
+        self.configuration = Configuration(access_token=access_token or "")
+        self.configuration.connection_pool_maxsize = max_in_flight
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        threading.Thread(target=self._run, daemon=True, name="line-sender").start()
+        self._ready.wait()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._setup())  # aiohttp session 必須在事件迴圈內建立
+        finally:
+            self._ready.set()
+        self.loop.run_forever()
+
+    async def _setup(self):
+        self.client = AsyncApiClient(self.configuration)
+        self.api = AsyncMessagingApi(self.client)
+        self.semaphore = asyncio.Semaphore(self.max_in_flight)
+
+    async def _call(self, method, *args, **kwargs):
+        async with self.semaphore:
+            return await method(*args, _request_timeout=self.timeout, **kwargs)
+
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    # 訊息可為字串（文字訊息）或 LINE 訊息 JSON（例如 Flex）
+    @staticmethod
+    def _messages(messages):
+        return [TextMessage(text=m) if isinstance(m, str) else Message.from_dict(m) for m in messages]
+
+    async def _push_groups(self, to, groups, retry_key):
+        for i, group in enumerate(groups):  # 依序送出，保持訊息順序
+            request = PushMessageRequest(to=to, messages=self._messages(group))
+            key = retry_key if retry_key and len(groups) == 1 else str(uuid.uuid4())
+            await self._call(self.api.push_message, request, x_line_retry_key=key)
+
+    # 超過 5 則時自動拆成多次 push
+    def push(self, to, messages, retry_key=None):
+        return self.submit(self._push_groups(to, group_messages(messages), retry_key))
+
+    # reply token 只能用一次，呼叫端需自行確保不超過 5 則
+    def reply(self, reply_token, messages):
+        request = ReplyMessageRequest(reply_token=reply_token, messages=self._messages(messages))
+        return self.submit(self._call(self.api.reply_message, request))
+
+    @staticmethod
+    def batches(user_ids, size=MULTICAST_LIMIT):
+        user_ids = list(dict.fromkeys(user_ids))  # 去除重複、保留順序
+        return [user_ids[i:i + size] for i in range(0, len(user_ids), size)]
+
+    # 單批 multicast（最多 500 人、5 則訊息）；重送時請沿用同一個 retry_key
+    def multicast_batch(self, user_ids, messages, retry_key):
+        request = MulticastRequest(to=user_ids, messages=self._messages(messages))
+        return self.submit(self._call(self.api.multicast, request, x_line_retry_key=retry_key))
+
+# --- 回覆策略：reply token 有時效，處理太久或回覆被拒時改用 push 送給使用者 ---
+class ReplySession:
+    def __init__(self, sender, reply_token, user_id, started=None, budget=50):
+        self.sender = sender
+        self.reply_token = reply_token
+        self.user_id = user_id
+        self.started = started or time.time()  # 使用者送出訊息的時間（秒）
+        self.budget = budget  # reply token 可安全使用的秒數
+        self.replied = False
+
+    @property
+    def elapsed(self):
+        return time.time() - self.started
+
+    def _push(self, messages):
+        if not messages:
+            return None
+        if not self.user_id:
+            print("無法改用 push：事件沒有 user_id")
+            return None
+        future = self.sender.push(self.user_id, messages)
+        future.add_done_callback(log_failure(f"推播給 {self.user_id}"))
+        return future
+
+    def _after_reply(self, messages, rest):
+        def callback(future):
+            if not future.cancelled() and future.exception() is not None:
+                print(f"回覆失敗，改用 push: {future.exception()}")
+                self._push(messages)
+            else:
+                self._push(rest)  # 超過 5 則的部分接著以 push 送出
+        return callback
+
+    def send(self, messages):
+        if self.replied or not self.reply_token or self.elapsed > self.budget:
+            return self._push(messages)
+        self.replied = True
+        first, *rest = group_messages(messages)
+        future = self.sender.reply(self.reply_token, first)
+        future.add_done_callback(self._after_reply(messages, [m for group in rest for m in group]))
+        return future
+
+    # 先以 reply token 回「查詢中」，之後的結果改用 push 送出
+    def acknowledge(self, text):
+        if self.replied or not self.reply_token or self.elapsed > self.budget:
+            return None
+        self.replied = True
+        future = self.sender.reply(self.reply_token, [text])
+        future.add_done_callback(log_failure("回覆查詢中訊息"))
+        return future
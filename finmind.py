@@ -0,0 +1,66 @@
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+FINMIND_URL = "https://api.finmindtrade.com/api/v4/data"
+SNAPSHOT_URL = "https://api.finmindtrade.com/api/v4/taiwan_stock_tick_snapshot"
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+class FinMindError(Exception):
+    pass
+
+# --- FinMind 共用連線：連線池重複使用 TLS 連線，並限制逾時與重試次數 ---
+class FinMindClient:
+    def __init__(self, token, url=FINMIND_URL, snapshot_url=SNAPSHOT_URL, connect_timeout=3.05, read_timeout=10,
+                 retries=2, backoff=0.5, max_backoff=4, budget=20, pool_size=10):
+        self.url = url
+        self.snapshot_url = snapshot_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.budget = budget  # 單次呼叫（含重試）最多花費的秒數
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # token 放在標頭，避免出現在網址與錯誤訊息中
+        self.session.headers.update({"Accept-Encoding": "gzip, deflate", "Authorization": f"Bearer {token}"})
+
+    def _sleep_before_retry(self, attempt, deadline):
+        delay = min(self.max_backoff, self.backoff * (2 ** attempt))
+        delay = random.uniform(0, delay)  # full jitter，避免多個請求同時重試
+        if time.monotonic() + delay >= deadline:
+            return False
+        time.sleep(delay)
+        return True
+
+    def fetch(self, dataset, **params):
+        return self._get(self.url, dataset, {"dataset": dataset, **params})
+
+    # 盤中即時快照（約每 5 秒更新）；codes 為空時回傳全市場
+    def snapshot(self, codes=None):
+        return self._get(self.snapshot_url, "tick_snapshot", {"data_id": list(codes)} if codes else {})
+
+    def _get(self, url, dataset, params):
+        deadline = time.monotonic() + self.budget
+        error = None
+        for attempt in range(self.retries + 1):
+            try:
+                r = self.session.get(url, params=params, timeout=self.timeout)
+                if r.status_code in RETRY_STATUS:
+                    error = FinMindError(f"{dataset} HTTP {r.status_code}")
+                else:
+                    r.raise_for_status()
+                    return r.json().get("data") or []
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = FinMindError(f"{dataset} 連線失敗: {e}")
+            except requests.RequestException as e:
+                raise FinMindError(f"{dataset} 請求失敗: {e}") from e
+            except ValueError as e:
+                raise FinMindError(f"{dataset} 回應格式錯誤: {e}") from e
+            if attempt == self.retries or not self._sleep_before_retry(attempt, deadline):
+                break
+        raise error
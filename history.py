@@ -0,0 +1,111 @@
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+from storage import file_lock
+
+# --- 本機歷史價格：每檔一個資料夾，每個欄位一個只會附加的二進位檔，讀取時以 memmap 對應 ---
+COLUMNS = {
+    "date": np.dtype("datetime64[D]"),
+    "open": np.dtype("float64"),
+    "high": np.dtype("float64"),
+    "low": np.dtype("float64"),
+    "close": np.dtype("float64"),
+    "volume": np.dtype("int64"),
+}
+STOCK_CODE = re.compile(r"[0-9]{4,6}[A-Z]?")  # 代碼會成為資料夾名稱，只接受台股代碼格式
+FINMIND_FIELDS = {"open": "open", "high": "max", "low": "min", "close": "close", "volume": "Trading_Volume"}
+
+class HistoryStore:
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._cache = {}  # code -> (筆數, 欄位 memmap)
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _dir(self, code):
+        if not STOCK_CODE.fullmatch(code):
+            raise ValueError(f"股票代碼格式錯誤: {code}")
+        return os.path.join(self.root, code)
+
+    def _path(self, code, column):
+        return os.path.join(self._dir(code), f"{column}.bin")
+
+    def _code_lock(self, code):
+        with self._lock:
+            return self._locks.setdefault(code, threading.Lock())
+
+    # --- 跨行程互斥：web worker 的首次回補與 leader 的每日更新可能同時寫同一檔 ---
+    @contextmanager
+    def _locked(self, code):
+        with self._code_lock(code):
+            os.makedirs(self._dir(code), exist_ok=True)
+            with file_lock(os.path.join(self._dir(code), "lock")):
+                yield
+
+    # date 欄最後寫入，正常情況下以 date 為準；取各欄最短者，中途當機留下的半筆資料會被忽略並在下次附加前截斷
+    def _length(self, code):
+        lengths = []
+        for name, dtype in COLUMNS.items():
+            try:
+                lengths.append(os.path.getsize(self._path(code, name)) // dtype.itemsize)
+            except FileNotFoundError:
+                return 0
+        return min(lengths)
+
+    def load(self, code):
+        n = self._length(code)
+        cached = self._cache.get(code)
+        if cached and cached[0] == n:
+            return cached[1]
+        if n == 0:
+            columns = {name: np.empty(0, dtype) for name, dtype in COLUMNS.items()}
+        else:
+            columns = {
+                name: np.memmap(self._path(code, name), dtype=dtype, mode="r", shape=(n,))
+                for name, dtype in COLUMNS.items()
+            }
+        self._cache[code] = (n, columns)
+        return columns
+
+    def last_date(self, code):
+        dates = self.load(code)["date"]
+        return dates[-1] if len(dates) else None
+
+    # 只附加比現有最後一天更新的資料；rows 為 FinMind TaiwanStockPrice 格式
+    def append(self, code, rows):
+        if not rows:  # 查無資料時不建立資料夾
+            return 0
+        with self._locked(code):
+            last = self.last_date(code)
+            rows = sorted(rows, key=lambda r: r["date"])
+            dates = np.array([r["date"] for r in rows], dtype=COLUMNS["date"])
+            keep = dates > last if last is not None else np.ones(len(dates), dtype=bool)
+            if not keep.any():
+                return 0
+            rows = [r for r, k in zip(rows, keep) if k]
+            os.makedirs(self._dir(code), exist_ok=True)
+            n = self._length(code)
+            for name, field in FINMIND_FIELDS.items():
+                values = np.array([r.get(field, 0) for r in rows], dtype=COLUMNS[name])
+                with open(self._path(code, name), "ab") as f:
+                    f.truncate(n * COLUMNS[name].itemsize)
+                    f.write(values.tobytes())
+            with open(self._path(code, "date"), "ab") as f:
+                f.truncate(n * COLUMNS["date"].itemsize)
+                f.write(dates[keep].tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            return len(rows)
+
+    # 日期區間查詢：以二分搜尋找出範圍，回傳的是 memmap 切片，不複製資料
+    def range(self, code, start=None, end=None):
+        columns = self.load(code)
+        dates = columns["date"]
+        lo = 0 if start is None else np.searchsorted(dates, np.datetime64(start, "D"), side="left")
+        hi = len(dates) if end is None else np.searchsorted(dates, np.datetime64(end, "D"), side="right")
+        return {name: values[lo:hi] for name, values in columns.items()}
@@ -0,0 +1,140 @@
+import math
+import threading
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+LOOKBACK = 250  # 每檔只取最近約一年的交易日計算，單檔查詢與批次計算結果一致
+EWM_TOLERANCE = 1e-9  # 指數平滑的權重小於此值即截斷
+
+# --- 指標計算：全部以陣列運算完成，最後一個維度為時間軸，可一次處理多檔（2D） ---
+def sma(x, n):
+    x = np.asarray(x, dtype=float)
+    out = np.full(x.shape, np.nan)
+    if x.shape[-1] < n:
+        return out
+    csum = np.cumsum(x, axis=-1)
+    out[..., n - 1] = csum[..., n - 1] / n
+    out[..., n:] = (csum[..., n:] - csum[..., :-n]) / n
+    return out
+
+# 指數平滑改寫成截斷權重的滑動視窗內積，不需逐根 K 棒迴圈；開頭不足的部分以已有權重正規化
+def ewm(x, alpha):
+    x = np.asarray(x, dtype=float)
+    n = x.shape[-1]
+    if n == 0:
+        return x.copy()
+    k = min(n, math.ceil(math.log(EWM_TOLERANCE) / math.log(1 - alpha)))
+    weights = alpha * (1 - alpha) ** np.arange(k)
+    padded = np.pad(x, [(0, 0)] * (x.ndim - 1) + [(k - 1, 0)])
+    windows = sliding_window_view(padded, k, axis=-1)
+    norm = np.cumsum(weights)[np.minimum(np.arange(n), k - 1)]
+    return windows @ weights[::-1] / norm
+
+def rolling_min(x, n):
+    out = np.full(x.shape, np.nan)
+    if x.shape[-1] >= n:
+        out[..., n - 1:] = sliding_window_view(x, n, axis=-1).min(axis=-1)
+    return out
+
+def rolling_max(x, n):
+    out = np.full(x.shape, np.nan)
+    if x.shape[-1] >= n:
+        out[..., n - 1:] = sliding_window_view(x, n, axis=-1).max(axis=-1)
+    return out
+
+def rsi(close, n=14):
+    diff = np.diff(close, axis=-1)
+    gain = ewm(np.clip(diff, 0, None), 1 / n)
+    loss = ewm(np.clip(-diff, 0, None), 1 / n)
+    total = gain + loss
+    with np.errstate(invalid="ignore", divide="ignore"):
+        value = np.where(total > 0, 100 * gain / total, 50.0)
+    return np.concatenate([np.full(close.shape[:-1] + (1,), np.nan), value], axis=-1)
+
+# 台股慣用 KD：RSV 取 9 日，K、D 以 1/3 平滑
+def kd(high, low, close, n=9):
+    lowest = rolling_min(low, n)
+    highest = rolling_max(high, n)
+    span = highest - lowest
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rsv = np.where(span > 0, 100 * (close - lowest) / span, 50.0)
+    rsv = rsv[..., n - 1:] if close.shape[-1] >= n else rsv[..., :0]
+    k = ewm(rsv, 1 / 3)
+    d = ewm(k, 1 / 3)
+    pad = np.full(close.shape[:-1] + (close.shape[-1] - rsv.shape[-1],), np.nan)
+    return np.concatenate([pad, k], axis=-1), np.concatenate([pad, d], axis=-1)
+
+def macd(close, fast=12, slow=26, signal=9):
+    dif = ewm(close, 2 / (fast + 1)) - ewm(close, 2 / (slow + 1))
+    dea = ewm(dif, 2 / (signal + 1))
+    return dif, dea, dif - dea
+
+# 輸入為相同長度的一組 K 線（1D 或 2D），只回傳最後一根的指標值
+def latest_indicators(high, low, close):
+    k, d = kd(high, low, close)
+    dif, dea, osc = macd(close)
+    return {
+        "close": close[..., -1],
+        "ma5": sma(close, 5)[..., -1],
+        "ma20": sma(close, 20)[..., -1],
+        "ma60": sma(close, 60)[..., -1],
+        "rsi": rsi(close)[..., -1],
+        "k": k[..., -1],
+        "d": d[..., -1],
+        "dif": dif[..., -1],
+        "macd": dea[..., -1],
+        "osc": osc[..., -1],
+    }
+
+# --- 指標快取：以（代碼, 最後交易日）為鍵，收盤後重複查詢直接回傳 ---
+class IndicatorCache:
+    def __init__(self, history, lookback=LOOKBACK):
+        self.history = history
+        self.lookback = lookback
+        self._memo = {}  # code -> (最後交易日, 指標)
+        self._lock = threading.Lock()
+
+    def get(self, code):
+        return self.get_many([code]).get(code)
+
+    # 未命中的代碼依資料長度分組，同組堆成 2D 陣列一次算完
+    def get_many(self, codes):
+        results, groups = {}, {}
+        for code in dict.fromkeys(codes):
+            columns = self.history.load(code)
+            n = len(columns["date"])
+            if n == 0:
+                continue
+            last = str(columns["date"][-1])
+            cached = self._memo.get(code)
+            if cached and cached[0] == last:
+                results[code] = cached[1]
+                continue
+            groups.setdefault(min(n, self.lookback), []).append((code, last, columns))
+
+        for length, members in groups.items():
+            stacked = {
+                name: np.stack([np.asarray(columns[name][-length:], dtype=float) for _, _, columns in members])
+                for name in ("high", "low", "close")
+            }
+            values = latest_indicators(stacked["high"], stacked["low"], stacked["close"])
+            with self._lock:
+                for i, (code, last, _) in enumerate(members):
+                    result = {"date": last, **{name: float(column[i]) for name, column in values.items()}}
+                    self._memo[code] = (last, result)
+                    results[code] = result
+        return results
+
+def _fmt(value, digits=2):
+    return "—" if value is None or math.isnan(value) else f"{value:.{digits}f}"
+
+def format_indicators(result):
+    return (
+        f"MA5/20/60：{_fmt(result['ma5'])} / {_fmt(result['ma20'])} / {_fmt(result['ma60'])}\n"
+        f"RSI14：{_fmt(result['rsi'], 1)}　K/D：{_fmt(result['k'], 1)} / {_fmt(result['d'], 1)}\n"
+        f"MACD：DIF {_fmt(result['dif'])}　訊號 {_fmt(result['macd'])}　柱 {_fmt(result['osc'])}"
+    )
+
+def format_indicator_summary(result):
+    return f"RSI {_fmt(result['rsi'], 0)}｜K/D {_fmt(result['k'], 0)}/{_fmt(result['d'], 0)}｜MACD柱 {_fmt(result['osc'])}"
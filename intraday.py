@@ -0,0 +1,138 @@
+import threading
+import time
+from datetime import datetime, time as dt_time
+
+import numpy as np
+
+MARKET_OPEN = dt_time(9, 0)
+MARKET_CLOSE = dt_time(13, 30)
+FIELDS = ("open", "high", "low", "close", "volume")
+
+# --- 盤中報價簿：每檔一個固定位置（slot），數值放在同一個二維陣列，只在價格或成交量改變時發出事件 ---
+class QuoteBook:
+    def __init__(self, capacity=64):
+        self._index = {}  # code -> slot
+        self._codes = []
+        self._values = np.full((capacity, len(FIELDS)), np.nan)
+        self._times = np.zeros(capacity, dtype="datetime64[s]")  # 最後成交時間
+        self._seen = np.zeros(capacity)  # 最後一次輪詢確認的 monotonic 時間
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def _slot(self, code):
+        slot = self._index.get(code)
+        if slot is None:
+            slot = len(self._codes)
+            if slot == len(self._values):  # 容量不足時倍增
+                self._values = np.vstack([self._values, np.full_like(self._values, np.nan)])
+                self._times = np.concatenate([self._times, np.zeros_like(self._times)])
+                self._seen = np.concatenate([self._seen, np.zeros_like(self._seen)])
+            self._index[code] = slot
+            self._codes.append(code)
+        return slot
+
+    # ticks: {代碼: (成交時間, open, high, low, close, volume)}；回傳有變動的 [(代碼, row)]
+    def update(self, ticks):
+        if not ticks:
+            return []
+        now = time.monotonic()
+        codes = list(ticks)
+        with self._lock:
+            slots = np.array([self._slot(code) for code in codes])
+            new = np.array([ticks[code][1:] for code in codes], dtype=float)
+            old = self._values[slots]
+            # 第一次出現的代碼舊值為 NaN，比較結果為不相等，也算變動
+            changed = np.any(new[:, 3:] != old[:, 3:], axis=1)
+            self._values[slots] = new
+            self._times[slots] = np.array([ticks[code][0] for code in codes], dtype="datetime64[s]")
+            self._seen[slots] = now
+            events = [(codes[i], self._row(slots[i])) for i in np.flatnonzero(changed)]
+        for listener in self._listeners:
+            try:
+                listener(events)
+            except Exception as e:
+                print(f"盤中事件處理失敗: {e}")
+        return events
+
+    def _row(self, slot):
+        open_, high, low, close, volume = self._values[slot]
+        stamp = str(self._times[slot])
+        return {
+            "stock_id": self._codes[slot],
+            "date": stamp[:10],
+            "time": stamp[11:19],
+            "open": float(open_),
+            "max": float(high),
+            "min": float(low),
+            "close": float(close),
+            "Trading_Volume": int(volume),
+        }
+
+    # 只回傳最近 max_age 秒內輪詢確認過的報價，輪詢停止後自動退回一般查詢
+    def get(self, code, max_age=90):
+        with self._lock:
+            slot = self._index.get(code)
+            if slot is None or time.monotonic() - self._seen[slot] > max_age:
+                return None
+            return self._row(slot)
+
+# --- 盤中輪詢：只在交易日 09:00–13:30 執行，有變動就加快，連續沒變動則逐步放慢 ---
+class IntradayPoller:
+    def __init__(self, book, fetch, codes, tz, calendar=None, min_interval=5, max_interval=30, codes_ttl=60):
+        self.book = book
+        self.fetch = fetch  # codes -> {代碼: tick}
+        self.codes = codes  # () -> 要輪詢的代碼
+        self.tz = tz
+        self.calendar = calendar
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.codes_ttl = codes_ttl
+        self.interval = max_interval
+        self._watched = []
+        self._watched_at = 0
+        self._thread = None
+
+    def in_session(self, now=None):
+        now = now or datetime.now(self.tz)
+        if not MARKET_OPEN <= now.time() < MARKET_CLOSE:
+            return False
+        return self.calendar.is_trading_day(now.date()) if self.calendar else now.weekday() < 5
+
+    def _watched_codes(self):
+        if time.monotonic() - self._watched_at > self.codes_ttl:
+            self._watched = self.codes()
+            self._watched_at = time.monotonic()
+        return self._watched
+
+    def poll_once(self):
+        codes = self._watched_codes()
+        if not codes:
+            return []
+        return self.book.update(self.fetch(codes))
+
+    def run(self):
+        while True:
+            if not self.in_session():
+                self.interval = self.max_interval
+                time.sleep(30)
+                continue
+            try:
+                events = self.poll_once()
+                if events:
+                    self.interval = self.min_interval
+                else:
+                    self.interval = min(self.max_interval, self.interval * 2)
+            except Exception as e:
+                print(f"盤中輪詢失敗: {e}")
+                self.interval = self.max_interval
+            time.sleep(self.interval)
+
+    # 排程 leader 重新啟動時可能再次呼叫，只保留一個輪詢執行緒
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self.run, daemon=True, name="intraday")
+        self._thread.start()
@@ -0,0 +1,58 @@
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:  # 非 POSIX 平台只會有單一行程，直接視為 leader
+    fcntl = None
+
+# --- 排程 leader 選舉：以 fcntl 檔案鎖決定由哪個行程執行排程 ---
+# 持有鎖的行程結束（包含異常終止）時，作業系統會自動釋放鎖，其他行程在下次嘗試時接手
+class LeaderLock:
+    def __init__(self, path, retry_interval=15):
+        self.path = path
+        self.retry_interval = retry_interval
+        self._fd = None
+
+    @property
+    def is_leader(self):
+        return self._fd is not None
+
+    def try_acquire(self):
+        if self._fd is not None:
+            return True
+        if fcntl is None:
+            self._fd = -1
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is None:
+            return
+        if self._fd >= 0:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+        self._fd = None
+
+# target 異常結束時釋放鎖並稍後重試，讓其他行程（或自己）有機會接手，而不是持鎖卻沒有排程在跑
+def run_as_leader(lock, target):
+    while True:
+        while not lock.try_acquire():
+            time.sleep(lock.retry_interval)
+        print(f"🗳️ 行程 {os.getpid()} 取得排程 leader")
+        try:
+            target()
+        except Exception as e:
+            print(f"排程 leader 執行失敗，釋放鎖: {e!r}")
+        finally:
+            lock.release()
+        time.sleep(lock.retry_interval)
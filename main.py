@@ -1,14 +1,36 @@
 from dotenv import load_dotenv
+import json
 import os
-import requests
 from datetime import datetime, timedelta
 import pytz
 from flask import Flask, request
-from linebot import LineBotApi, WebhookHandler
-from linebot.exceptions import InvalidSignatureError
-from linebot.models import MessageEvent, TextMessage, TextSendMessage
+from linebot.v3 import WebhookParser
+from linebot.v3.exceptions import InvalidSignatureError
+from linebot.v3.webhooks import MessageEvent, TextMessageContent
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from alerts import AlertEngine, AlertStore, describe, parse_alert
+from cache_backend import make_backend
+from concurrent_fetch import ConcurrentFetcher
+from cron import Job, Scheduler
+from dedup import EventDeduplicator, is_redelivery
+from delivery import LineSender, ReplySession, log_failure
+from finmind import FinMindClient
+from history import STOCK_CODE, HistoryStore
+from indicators import IndicatorCache, format_indicators, format_indicator_summary
+from intraday import IntradayPoller, QuoteBook
+from leader import LeaderLock, run_as_leader
+from outbox import Outbox
+from providers import FinMindProvider, QuoteRouter, YFinanceProvider
+from quote_cache import QuoteCache
+from render import iter_flex_messages, iter_text_messages
+from reports import ReportPipeline
+from screener import SCREENS, WINDOW as MARKET_WINDOW, MarketSnapshot
+from stock_names import StockNameRegistry
+from trading_calendar import TradingCalendar, load_holidays
+from user_watchlists import UserWatchlists
+from watchlist import WatchlistStore
 
 # --- 載入 .env ---
 load_dotenv()
@@ -22,11 +44,44 @@ LINE_CHANNEL_SECRET = os.getenv("LINE_CHANNEL_SECRET")
 LINE_USER_IDS = [uid.strip() for uid in (os.getenv("LINE_USER_IDS") or "").split(",") if uid.strip()]
 FINMIND_API_TOKEN = os.getenv("FINMIND_API_TOKEN")
 
+FINMIND_CONNECT_TIMEOUT = float(os.getenv("FINMIND_CONNECT_TIMEOUT") or 3.05)
+FINMIND_READ_TIMEOUT = float(os.getenv("FINMIND_READ_TIMEOUT") or 10)
+FINMIND_RETRIES = int(os.getenv("FINMIND_RETRIES") or 2)
+QUOTE_WORKERS = int(os.getenv("QUOTE_WORKERS") or 8)
+QUOTE_TIMEOUT = float(os.getenv("QUOTE_TIMEOUT") or 15)
+BULK_WORKERS = int(os.getenv("BULK_WORKERS") or 2)
+BULK_TIMEOUT = float(os.getenv("BULK_TIMEOUT") or 60)
+QUOTE_PROVIDERS = [name.strip() for name in (os.getenv("QUOTE_PROVIDERS") or "finmind,yfinance").split(",") if name.strip()]
+QUOTE_CACHE_SIZE = int(os.getenv("QUOTE_CACHE_SIZE") or 2048)
+CACHE_BACKEND = os.getenv("CACHE_BACKEND") or "memory"  # memory 或 sqlite（多個 gunicorn worker 共用）
+CACHE_PATH = os.getenv("CACHE_PATH") or "cache.sqlite3"
+LINE_MAX_IN_FLIGHT = int(os.getenv("LINE_MAX_IN_FLIGHT") or 16)
+LINE_SEND_RATE = float(os.getenv("LINE_SEND_RATE") or 20)  # 每秒送出的推播請求上限
+OUTBOX_PATH = os.getenv("OUTBOX_PATH") or "outbox.sqlite3"
+USER_DB_PATH = os.getenv("USER_DB_PATH") or "users.sqlite3"
+HISTORY_DIR = os.getenv("HISTORY_DIR") or "history"
+HISTORY_BACKFILL_DAYS = int(os.getenv("HISTORY_BACKFILL_DAYS") or 400)
+HISTORY_MISS_TTL = float(os.getenv("HISTORY_MISS_TTL") or 6 * 60 * 60)  # 回補查無資料的代碼，多久內不再重查
+MARKET_SNAPSHOT_PATH = os.getenv("MARKET_SNAPSHOT_PATH") or "market.npz"
+SCREEN_LIMIT = int(os.getenv("SCREEN_LIMIT") or 30)
+EVENT_WORKERS = int(os.getenv("EVENT_WORKERS") or 8)  # 背景處理 webhook 事件的執行緒數
+REPLY_TOKEN_BUDGET = float(os.getenv("REPLY_TOKEN_BUDGET") or 50)  # 超過此秒數改用 push 回覆
+REPORT_STYLE = os.getenv("REPORT_STYLE") or "text"  # 追蹤清單報表格式：text 或 flex
+FETCHING_NOTICE = (os.getenv("FETCHING_NOTICE") or "").lower() in ("1", "true", "yes")  # 查價前先回覆「查詢中」
+INTRADAY_POLLING = (os.getenv("INTRADAY_POLLING") or "").lower() in ("1", "true", "yes")  # 盤中輪詢即時快照
+INTRADAY_MIN_INTERVAL = float(os.getenv("INTRADAY_MIN_INTERVAL") or 5)
+INTRADAY_MAX_INTERVAL = float(os.getenv("INTRADAY_MAX_INTERVAL") or 30)
+SCHEDULER_LOCK_FILE = os.getenv("SCHEDULER_LOCK_FILE") or "scheduler.lock"
+SCHEDULE_FILE = os.getenv("SCHEDULE_FILE") or "schedule.json"
+SCHEDULE_STATE_FILE = os.getenv("SCHEDULE_STATE_FILE") or "schedule_state.json"
+
 if not FINMIND_API_TOKEN:
     raise ValueError("❌ 請確認 FINMIND_API_TOKEN 已設定在 .env 檔案中")
 
-line_bot_api = LineBotApi(LINE_CHANNEL_ACCESS_TOKEN)
-handler = WebhookHandler(LINE_CHANNEL_SECRET)
+parser = WebhookParser(LINE_CHANNEL_SECRET)
+line_sender = LineSender(LINE_CHANNEL_ACCESS_TOKEN, max_in_flight=LINE_MAX_IN_FLIGHT)
+outbox = Outbox(OUTBOX_PATH, line_sender, rate=LINE_SEND_RATE)
+outbox.start()
 
 # --- 檔案存追蹤清單 ---
 TICKER_FILE = "tickers.txt"
@@ -34,132 +89,467 @@ if not os.path.exists(TICKER_FILE):
     with open(TICKER_FILE, "w") as f:
         f.write("0050\n0056\n00878\n00919\n2330\n2317\n2382\n2010")
 
+watchlist = WatchlistStore(TICKER_FILE)
+
 def load_tickers():
-    with open(TICKER_FILE, "r") as f:
-        return [x.strip() for x in f.readlines() if x.strip()]
+    return watchlist.codes()
 
-def save_tickers(tickers):
-    with open(TICKER_FILE, "w") as f:
-        f.write("\n".join(sorted(set(tickers))))
+# --- 個人追蹤清單：依 LINE user_id 分開存放，tickers.txt 作為新使用者的預設清單 ---
+user_watchlists = UserWatchlists(USER_DB_PATH)
+
+def user_tickers(user_id):
+    if not user_id:
+        return load_tickers()
+    return user_watchlists.codes(user_id, default=load_tickers())
+
+def add_ticker(user_id, code):
+    if not user_id:
+        return watchlist.add(code)
+    return user_watchlists.add(user_id, code, default=load_tickers())
+
+def remove_ticker(user_id, code):
+    if not user_id:
+        return watchlist.remove(code)
+    return user_watchlists.remove(user_id, code, default=load_tickers())
+
+# --- FinMind 共用連線 ---
+finmind = FinMindClient(
+    FINMIND_API_TOKEN,
+    connect_timeout=FINMIND_CONNECT_TIMEOUT,
+    read_timeout=FINMIND_READ_TIMEOUT,
+    retries=FINMIND_RETRIES,
+)
+fetcher = ConcurrentFetcher(max_workers=QUOTE_WORKERS, timeout=QUOTE_TIMEOUT)
+# 歷史回補等大量下載另用小型執行緒池，避免佔滿即時查價用的 fetcher
+bulk_fetcher = ConcurrentFetcher(max_workers=BULK_WORKERS, timeout=BULK_TIMEOUT)
+
+def bare_code(stock_code):
+    return stock_code.replace(".TW", "")
+
+def format_quote(stock_code, name, row):
+    if row.get("time"):  # 盤中即時報價
+        return f"{bare_code(stock_code)} {name}\n成交價：{row['close']:g}（{row['date']} {row['time']}）"
+    return f"{bare_code(stock_code)} {name}\n收盤價：{row['close']}（{row['date']}）"
+
+def format_missing(stock_code):
+    return f"{bare_code(stock_code)} 無法取得資料（可能代碼錯誤或近期無交易）"
+
+# --- FinMind 一次取得全部股票名稱（代碼 → 名稱） ---
+def fetch_stock_names():
+    try:
+        rows = finmind.fetch("TaiwanStockInfo")
+    except Exception as e:
+        print(f"取得股票名稱表失敗: {e}")
+        return {}
+    names = {}
+    for row in rows:
+        names.setdefault(row.get("stock_id"), row.get("stock_name", ""))
+    return names
+
+# --- 股票名稱表：啟動時讀本機檔，每日於背景更新 ---
+STOCK_NAME_FILE = "stock_names.json"
+stock_names = StockNameRegistry(fetch_stock_names, STOCK_NAME_FILE)
+stock_names.start()
 
-# --- FinMind 取得股票名稱 ---
 def get_stock_name(stock_code):
-    if not stock_code.endswith(".TW"):
-        stock_code += ".TW"
-    url = "https://api.finmindtrade.com/api/v4/data"
-    params = {"dataset": "TaiwanStockInfo", "data_id": stock_code, "token": FINMIND_API_TOKEN}
-    r = requests.get(url, params=params)
-    data = r.json()
-    if data.get("data"):
-        return data["data"][0].get("stock_name", "")
-    return ""
-
-# --- 取得股票價格（自動往前補資料） ---
-def get_stock_info(stock_code):
-    if not stock_code.endswith(".TW"):
-        stock_code += ".TW"
+    return stock_names.get(bare_code(stock_code))
+
+# --- 交易日曆：由 FinMind 交易日資料集載入，每日於背景更新 ---
+TRADING_CALENDAR_FILE = "trading_dates.json"
+HOLIDAY_FILE = os.getenv("HOLIDAY_FILE") or "twse_holidays.txt"
+CALENDAR_HISTORY_DAYS = 400
 
-    url = "https://api.finmindtrade.com/api/v4/data"
+def fetch_trading_dates():
+    start = datetime.now(pytz.timezone("Asia/Taipei")).date() - timedelta(days=CALENDAR_HISTORY_DAYS)
+    try:
+        rows = finmind.fetch("TaiwanStockTradingDate", start_date=start.strftime("%Y-%m-%d"))
+    except Exception as e:
+        print(f"取得交易日曆失敗: {e}")
+        return []
+    return [datetime.strptime(row["date"], "%Y-%m-%d").date() for row in rows if row.get("date")]
+
+trading_calendar = TradingCalendar(fetch_trading_dates, TRADING_CALENDAR_FILE, holidays=load_holidays(HOLIDAY_FILE))
+
+# --- 查詢區間：最近交易日與其前一個交易日（當日收盤資料尚未公布時可回補） ---
+def quote_date_range():
     today = datetime.now(pytz.timezone("Asia/Taipei")).date()
-    date = today
-
-    for _ in range(5):  # 最多往前5天
-        params = {
-            "dataset": "TaiwanStockPrice",
-            "data_id": stock_code,
-            "token": FINMIND_API_TOKEN,
-            "date": date.strftime("%Y-%m-%d"),
-        }
-        r = requests.get(url, params=params)
-        data = r.json()
-        if data.get("data"):
-            latest = data["data"][-1]
-            name = get_stock_name(stock_code)
-            return f"{stock_code.replace('.TW', '')} {name}\n收盤價：{latest['close']}（{latest['date']}）"
-        date -= timedelta(days=1)
-
-    return f"{stock_code.replace('.TW', '')} 無法取得資料（可能代碼錯誤或近期無交易）"
-
-# --- 批次抓取追蹤清單 ---
-def get_stock_prices():
-    tickers = load_tickers()
-    results = [get_stock_info(code) for code in tickers]
-    return "\n\n".join(results)
+    session = trading_calendar.last_session(today) or today
+    previous = trading_calendar.previous_session(session) or session - timedelta(days=1)
+    known = trading_calendar.last_known()
+    if known and session > known:  # 推估的交易日可能其實休市：區間從最後一個確定的交易日開始
+        previous = min(previous, known)
+    return previous.strftime("%Y-%m-%d"), session.strftime("%Y-%m-%d")
+
+# --- 行情來源：依 QUOTE_PROVIDERS 順序，主要來源失敗或過慢時改用備援，回傳格式一致 ---
+quote_providers = {
+    "finmind": FinMindProvider(finmind, fetcher),
+    # 備援使用自己的執行緒池：主要來源的逐檔查詢塞滿 fetcher 時，對沖請求仍能立即執行
+    "yfinance": YFinanceProvider(ConcurrentFetcher(max_workers=QUOTE_WORKERS, timeout=QUOTE_TIMEOUT)),
+}
+# webhook 事件執行緒加上排程同時查價時，每個呼叫都要能同時跑主要與備援請求
+quote_router = QuoteRouter(
+    [quote_providers[name] for name in QUOTE_PROVIDERS],
+    max_workers=(EVENT_WORKERS + 2) * len(QUOTE_PROVIDERS),
+)
+
+def _fetch_quotes(codes, start, end):
+    return quote_router.fetch_quotes(codes, start, end)
+
+# --- 報價快取：webhook 與排程推播共用 ---
+cache_backend = make_backend(CACHE_BACKEND, CACHE_PATH, maxsize=QUOTE_CACHE_SIZE)
+quote_cache = QuoteCache(cache_backend)
+
+def fetch_price_snapshot(codes):
+    wanted = sorted({bare_code(c) for c in codes})
+    if not wanted:
+        return {}
+    hot = {}
+    for code in wanted:
+        row = quote_book.get(code, max_age=INTRADAY_MAX_INTERVAL * 3)
+        if row:
+            hot[code] = row  # 盤中輪詢中的代碼直接由記憶體回應
+    wanted = [code for code in wanted if code not in hot]
+    if not wanted:
+        return hot
+    start, end = quote_date_range()
+    return {**quote_cache.get_many(wanted, end, lambda missing: _fetch_quotes(missing, start, end)), **hot}
+
+# --- 取得股票價格（依交易日曆直接查詢最近交易日） ---
+def get_stock_info(stock_code):
+    row = fetch_price_snapshot([stock_code]).get(bare_code(stock_code))
+    if row:
+        return format_quote(stock_code, get_stock_name(stock_code), row)
+    return format_missing(stock_code)
+
+# --- 批次抓取追蹤清單，依設定輸出分段文字或 Flex 表格（每則皆在 LINE 限制內） ---
+def collect_quotes(tickers, snapshot=None):
+    if snapshot is None:
+        snapshot = fetch_price_snapshot(tickers)
+    return [(bare_code(code), get_stock_name(code), snapshot.get(bare_code(code))) for code in tickers]
+
+def render_report(title, quotes, technicals=None):
+    technicals = technicals or {}
+    blocks = [
+        format_quote(code, name, row) + (f"\n{format_indicator_summary(technicals[code])}" if code in technicals else "")
+        if row else format_missing(code)
+        for code, name, row in quotes
+    ]
+    if not blocks:
+        blocks = ["目前追蹤清單是空的。"]
+    if REPORT_STYLE == "flex" and quotes:
+        alt_text = "\n".join(([title] if title else []) + blocks)
+        return list(iter_flex_messages(title or "📈 追蹤清單股價", quotes, alt_text))
+    return list(iter_text_messages(([title] if title else []) + blocks))
+
+def get_stock_prices(title=None, tickers=None):
+    return render_report(title, collect_quotes(load_tickers() if tickers is None else tickers))
+
+# --- 推播報表：排程時段前先產生，到點直接送出 ---
+# 所有使用者清單的聯集只抓一次行情，清單相同的使用者合併為同一組 multicast
+def push_recipients():
+    return list(dict.fromkeys(LINE_USER_IDS + user_watchlists.users()))
+
+def build_stock_report(slot):
+    title = f"📈 台股追蹤（{slot.strftime('%Y-%m-%d %H:%M')}）"
+    lists = user_watchlists.all_lists(LINE_USER_IDS, default=load_tickers())
+    union = sorted({code for codes in lists.values() for code in codes})
+    snapshot = fetch_price_snapshot(union)
+    technicals = indicator_cache.get_many([bare_code(code) for code in union if STOCK_CODE.fullmatch(bare_code(code))])
+    groups = {}
+    for uid, codes in lists.items():
+        groups.setdefault(tuple(codes), []).append(uid)
+    return [(uids, render_report(title, collect_quotes(list(codes), snapshot), technicals)) for codes, uids in groups.items()]
+
+report_pipeline = ReportPipeline(build_stock_report)
+
+def prepare_stock_report(slot):
+    report_pipeline.prepare(slot)
 
 # --- LINE 推播 ---
-def push_stock_message():
-    if not LINE_USER_IDS:
-        print("尚未設定 LINE_USER_IDS，無法推播。")
+def push_stock_message(slot=None):
+    if not push_recipients():
+        print("尚未設定 LINE_USER_IDS，也沒有使用者建立追蹤清單，無法推播。")
+        return
+    slot = slot or datetime.now(pytz.timezone("Asia/Taipei")).replace(second=0, microsecond=0)
+    for user_ids, messages in report_pipeline.take(slot):
+        outbox.enqueue(user_ids, messages)
+
+# --- 價格警示：依每次行情快照檢查，只推播新觸發的警示 ---
+alert_store = AlertStore(USER_DB_PATH)
+alert_engine = AlertEngine(alert_store)
+
+def notify_alerts(fired):
+    by_user = {}
+    for user_id, code, direction, threshold, price in fired:
+        word = "突破" if direction == "above" else "跌破"
+        line = f"🔔 {code} {get_stock_name(code)} 已{word} {threshold:g}（目前 {price:g}）"
+        by_user.setdefault(user_id, []).append(line)
+    for user_id, lines in by_user.items():
+        outbox.enqueue([user_id], list(iter_text_messages(lines, sep="\n")))
+
+def check_price_alerts(slot=None):
+    alert_engine.sync()
+    codes = alert_engine.codes()
+    if not codes:
         return
-    tz = pytz.timezone("Asia/Taipei")
-    now = datetime.now(tz).strftime("%Y-%m-%d %H:%M")
-    message = f"📈 台股追蹤（{now}）\n\n{get_stock_prices()}"
-    for uid in LINE_USER_IDS:
+    snapshot = fetch_price_snapshot(codes)
+    prices = {code: float(row["close"]) for code, row in snapshot.items()}
+    notify_alerts(alert_engine.evaluate(prices))
+
+# --- 歷史價格：新標的回補一段歷史，之後每日只附加最新交易日 ---
+history_store = HistoryStore(HISTORY_DIR)
+indicator_cache = IndicatorCache(history_store)
+history_misses = {}  # code -> 回補查無資料的時間（例如代碼錯誤）
+
+def history_missing(code):
+    return time.time() - history_misses.get(code, 0) < HISTORY_MISS_TTL
+
+def tracked_codes():
+    lists = user_watchlists.all_lists(LINE_USER_IDS, default=load_tickers())
+    codes = {code for tickers in lists.values() for code in tickers} | set(load_tickers()) | set(alert_engine.codes())
+    return sorted({bare_code(code) for code in codes if STOCK_CODE.fullmatch(bare_code(code))})
+
+def update_history(slot=None, codes=None, pool=None):
+    codes = tracked_codes() if codes is None else codes
+    previous, session = quote_date_range()
+    backfill_start = (datetime.now(pytz.timezone("Asia/Taipei")).date() - timedelta(days=HISTORY_BACKFILL_DAYS)).strftime("%Y-%m-%d")
+    behind_one, ranges = [], {}
+    for code in codes:
+        last = history_store.last_date(code)
+        if last is None:
+            if not history_missing(code):
+                ranges[code] = backfill_start
+        elif str(last) == previous:
+            behind_one.append(code)  # 只差最新一天：由共用的行情快照取得
+        elif str(last) < previous:
+            ranges[code] = str(last + 1)
+
+    snapshot = fetch_price_snapshot(behind_one)
+    for code in behind_one:
+        if code in snapshot:
+            history_store.append(code, [snapshot[code]])
+
+    def backfill(code):
+        rows = finmind.fetch("TaiwanStockPrice", data_id=code + ".TW", start_date=ranges[code], end_date=session)
+        if not rows and ranges[code] == backfill_start:
+            history_misses[code] = time.time()
+        return history_store.append(code, rows)
+
+    (pool or bulk_fetcher).map(backfill, list(ranges))
+
+def get_technicals(code):
+    code = bare_code(code)
+    # 第一次查詢的代碼先回補歷史；未列入追蹤的代碼不在每日更新內，查詢時補上缺少的交易日
+    last = history_store.last_date(code)
+    if (last is None and not history_missing(code)) or (last is not None and str(last) < quote_date_range()[1]):
+        update_history(codes=[code], pool=fetcher)  # 使用者正在等待：單檔回補走即時查價的執行緒池
+    result = indicator_cache.get(code)
+    if not result:
+        return format_missing(code)
+    return f"📊 {code} {get_stock_name(code)}（{result['date']}）\n收盤價：{result['close']:g}\n{format_indicators(result)}"
+
+# --- 盤中模式：輪詢所有追蹤代碼的即時快照，只有價格或成交量變動時才觸發警示 ---
+quote_book = QuoteBook()
+
+# FinMind 即時快照的成交量單位為張，換算成股以和日線一致
+def fetch_intraday(codes):
+    ticks = {}
+    for row in finmind.snapshot(codes):
+        code = row.get("stock_id")
+        if code in codes and row.get("close"):
+            ticks[code] = (row["date"][:19], row["open"], row["high"], row["low"], row["close"], row.get("total_volume", 0) * 1000)
+    return ticks
+
+def publish_intraday(events):
+    if not events:
+        return
+    _, session = quote_date_range()
+    quote_cache.put_many(session, dict(events))
+    notify_alerts(alert_engine.evaluate({code: row["close"] for code, row in events}))
+
+quote_book.subscribe(publish_intraday)
+intraday_poller = IntradayPoller(
+    quote_book,
+    fetch_intraday,
+    tracked_codes,
+    pytz.timezone("Asia/Taipei"),
+    calendar=trading_calendar,
+    min_interval=INTRADAY_MIN_INTERVAL,
+    max_interval=INTRADAY_MAX_INTERVAL,
+)
+
+# --- 全市場篩選：每日以全市場查詢補齊最近一年的日線，篩選只在記憶體內做向量化比較 ---
+market_snapshot = MarketSnapshot(MARKET_SNAPSHOT_PATH)
+
+def recent_sessions(count):
+    day = trading_calendar.last_session(datetime.now(pytz.timezone("Asia/Taipei")).date())
+    sessions = []
+    while day and len(sessions) < count:
+        sessions.append(day)
+        day = trading_calendar.previous_session(day)
+    return sessions
+
+def update_market_snapshot(slot=None):
+    missing = [day.strftime("%Y-%m-%d") for day in recent_sessions(MARKET_WINDOW) if not market_snapshot.has_date(day)]
+    fetch_day = lambda day: finmind.fetch("TaiwanStockPrice", start_date=day, end_date=day)
+    results = bulk_fetcher.map(fetch_day, missing)
+    days = {day: rows for day, rows in zip(missing, results) if rows}  # 當日資料尚未公布者留待下次補
+    if days:
+        market_snapshot.update(days)
+
+def run_screen(args):
+    if not args or args[0] not in SCREENS:
+        return "可用篩選：\n" + "\n".join(f"🔎 篩選 {kind}" + (" [門檻]" if default else "") for kind, (_, default) in SCREENS.items())
+    kind = args[0]
+    threshold = SCREENS[kind][1]
+    if threshold is not None and len(args) > 1:  # 沒有門檻的條件（例如新高）忽略多餘參數
         try:
-            line_bot_api.push_message(uid, TextSendMessage(text=message))
-        except Exception as e:
-            print(f"發送給 {uid} 失敗: {e}")
+            threshold = float(args[1])
+        except ValueError:
+            return f"門檻必須是數字，例如：篩選 {kind} {SCREENS[kind][1]:g}"
+    latest = market_snapshot.latest_date()
+    if latest is None:
+        return "全市場資料尚未建立，請稍後再試。"
+    matches = market_snapshot.screen(kind, threshold)
+    lines = [f"🔎 {SCREENS[kind][0].format(threshold)}（{latest}）共 {len(matches)} 檔"]
+    for code, close, change, metric in matches[:SCREEN_LIMIT]:
+        line = f"{code} {get_stock_name(code)} {close:g}（{change:+.2f}%）"
+        lines.append(line + (f" 量比 {metric:.1f}" if kind == "爆量" else ""))
+    if len(matches) > SCREEN_LIMIT:
+        lines.append(f"…僅列出前 {SCREEN_LIMIT} 檔")
+    return list(iter_text_messages(lines, sep="\n"))
+
+# --- 自動排程：工作由 schedule.json 設定（預設交易日 13:00 與 14:00 推播，提前準備報表） ---
+SCHEDULE_ACTIONS = {
+    "push_stock_message": push_stock_message,
+    "prepare_stock_report": prepare_stock_report,
+    "check_price_alerts": check_price_alerts,
+    "update_history": update_history,
+    "update_market_snapshot": update_market_snapshot,
+}
+
+def load_schedule():
+    with open(SCHEDULE_FILE, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    return [
+        Job(
+            entry["name"],
+            entry["cron"],
+            SCHEDULE_ACTIONS[entry["action"]],
+            trading_days_only=entry.get("trading_days_only", False),
+            catch_up=entry.get("catch_up_minutes", 0) * 60,
+            prepare=SCHEDULE_ACTIONS[entry["prepare"]] if entry.get("prepare") else None,
+            lead=entry.get("prepare_seconds", 0),
+        )
+        for entry in entries
+    ]
 
-# --- 自動排程：每日 13:00 與 14:00 推播 ---
 def scheduler():
-    tz = pytz.timezone("Asia/Taipei")
-    while True:
-        now = datetime.now(tz)
-        if now.hour in [13, 14] and now.minute == 0:
-            print("⏰ 自動推播追蹤清單股價中...")
-            push_stock_message()
-            time.sleep(60)
-        time.sleep(30)
+    cron_scheduler = Scheduler(pytz.timezone("Asia/Taipei"), calendar=trading_calendar, state_path=SCHEDULE_STATE_FILE)
+    for job in load_schedule():
+        cron_scheduler.add_job(job)
+    if INTRADAY_POLLING:
+        intraday_poller.start()
+    cron_scheduler.run()
 
-threading.Thread(target=scheduler, daemon=True).start()
+# 多個 gunicorn worker 中只有取得鎖的那一個會執行排程
+scheduler_lock = LeaderLock(SCHEDULER_LOCK_FILE)
+threading.Thread(target=run_as_leader, args=(scheduler_lock, scheduler), daemon=True).start()
 
 # --- Flask routes ---
 @app.route("/")
 def home():
     return "Line Stock Bot is running."
 
+@app.route("/providers")
+def provider_status():
+    return quote_router.status()
+
 @app.route("/callback", methods=['POST'])
 def callback():
     signature = request.headers['X-Line-Signature']
     body = request.get_data(as_text=True)
     try:
-        handler.handle(body, signature)
+        events = parser.parse(body, signature)
     except InvalidSignatureError:
         return "Invalid signature", 400
+    # 驗證簽章後立即回應 200，事件交給背景執行緒處理，不受 FinMind 延遲影響
+    for event in events:
+        event_id = getattr(event, "webhook_event_id", None)
+        if event_deduplicator.is_duplicate(event_id, is_redelivery(event)):
+            print(f"略過重複的 webhook 事件 {event_id}")
+            continue
+        event_pool.submit(dispatch_event, event).add_done_callback(log_failure("處理事件"))
     return "OK"
 
+# --- webhook 事件背景處理；LINE 重送的事件依 webhookEventId 去重（sqlite 後端時跨 worker 共用） ---
+event_pool = ThreadPoolExecutor(max_workers=EVENT_WORKERS, thread_name_prefix="event")
+event_deduplicator = EventDeduplicator(backend=cache_backend if CACHE_BACKEND == "sqlite" else None)
+
+def dispatch_event(event):
+    if isinstance(event, MessageEvent) and isinstance(event.message, TextMessageContent):
+        handle_message(event)
+
 # --- 處理使用者訊息 ---
-@handler.add(MessageEvent, message=TextMessage)
 def handle_message(event):
     text = event.message.text.strip()
-    tickers = load_tickers()
+    user_id = getattr(event.source, "user_id", None)
+    session = ReplySession(
+        line_sender,
+        event.reply_token,
+        user_id,
+        started=event.timestamp / 1000 if event.timestamp else None,
+        budget=REPLY_TOKEN_BUDGET,
+    )
+    if FETCHING_NOTICE and (text == "股價" or text.isdigit() or text.startswith("技術")):
+        session.acknowledge("⏳ 資料查詢中，請稍候…")
 
     if text == "清單":
+        tickers = user_tickers(user_id)
         reply = "📋 目前追蹤清單：\n" + "\n".join(tickers) if tickers else "目前追蹤清單是空的。"
     elif text.startswith("追蹤"):
         code = text.replace("追蹤", "").strip()
         if code:
-            tickers.append(code)
-            save_tickers(tickers)
+            add_ticker(user_id, code)
             reply = f"✅ 已新增 {code} 到追蹤清單"
         else:
             reply = "請輸入格式：追蹤 [代碼]"
     elif text.startswith("刪除"):
         code = text.replace("刪除", "").strip()
-        if code in tickers:
-            tickers.remove(code)
-            save_tickers(tickers)
+        if remove_ticker(user_id, code):
             reply = f"🗑️ 已刪除 {code} 從追蹤清單"
         else:
             reply = f"{code} 不在清單中"
     elif text == "股價":
-        reply = get_stock_prices()
+        reply = get_stock_prices(tickers=user_tickers(user_id))
+    elif parse_alert(text):
+        code, direction, threshold = parse_alert(text)
+        if user_id:
+            alert_id = alert_store.add(user_id, code, direction, threshold)
+            reply = f"🔔 已設定警示 #{alert_id}：{code} {describe(direction, threshold)}"
+        else:
+            reply = "請先將機器人加為好友後再設定警示"
+    elif text == "警示":
+        alerts = alert_store.active_for_user(user_id) if user_id else []
+        lines = [f"#{alert_id} {code} {describe(direction, threshold)}" for alert_id, code, direction, threshold in alerts]
+        reply = "🔔 目前的價格警示：\n" + "\n".join(lines) if lines else "目前沒有設定價格警示。"
+    elif text.startswith("取消警示"):
+        alert_id = text.replace("取消警示", "").strip().lstrip("#")
+        if user_id and alert_id.isdigit() and alert_store.cancel(user_id, int(alert_id)):
+            reply = f"🗑️ 已取消警示 #{alert_id}"
+        else:
+            reply = f"找不到警示 #{alert_id}"
+    elif text.startswith("技術"):
+        code = text.replace("技術", "").strip()
+        reply = get_technicals(code) if STOCK_CODE.fullmatch(code) else "請輸入格式：技術 [代碼]"
+    elif text.startswith("篩選"):
+        reply = run_screen(text.replace("篩選", "").split())
     elif text.isdigit():
         reply = get_stock_info(text)
     else:
-        reply = "可用指令：\n📈 追蹤 [代碼]\n🗑️ 刪除 [代碼]\n📋 清單\n💰 股價 [代碼]"
+        reply = "可用指令：\n📈 追蹤 [代碼]\n🗑️ 刪除 [代碼]\n📋 清單\n💰 股價 [代碼]\n📊 技術 [代碼]\n🔎 篩選 [條件]\n🔔 [代碼] 突破/跌破 [價格]\n🔔 警示／取消警示 [編號]"
 
-    line_bot_api.reply_message(event.reply_token, TextSendMessage(text=reply))
+    session.send(reply if isinstance(reply, list) else [reply])
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000)
\ No newline at end of file
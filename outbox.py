@@ -0,0 +1,146 @@
+import json
+import random
+import threading
+import time
+import uuid
+
+from linebot.v3.messaging import ApiException
+
+from render import group_messages
+from storage import ThreadLocalSQLite
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# --- 推播佇列：待送訊息先寫入 SQLite，重啟也不會遺失 ---
+# 每筆訊息在寫入時就產生 X-Line-Retry-Key，重送時沿用，LINE 會自動忽略重複的請求
+class Outbox:
+    def __init__(self, path, sender, rate=20, batch_size=20, max_attempts=6,
+                 backoff=2, max_backoff=300, stale_after=120, poll_interval=1, keep_days=7):
+        self.path = path
+        self.sender = sender  # LineSender
+        self.rate = rate  # 每秒最多送出幾個請求，平滑突發流量
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.stale_after = stale_after  # 「傳送中」超過此秒數視為中途當機，重新排入佇列
+        self.poll_interval = poll_interval
+        self.keep_days = keep_days  # 已送出的紀錄保留天數
+        self._conn = ThreadLocalSQLite(path)
+        self._wake = threading.Event()
+        self._conn().executescript("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                recipients TEXT NOT NULL,
+                messages TEXT NOT NULL,
+                retry_key TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                claimed_at REAL,
+                last_error TEXT,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at);
+        """)
+
+    # 收件者依 multicast 上限（500 人）、訊息依每次 5 則分批，每批一筆
+    def enqueue(self, user_ids, messages):
+        now = time.time()
+        rows = [
+            (json.dumps(batch), json.dumps(group, ensure_ascii=False), str(uuid.uuid4()), now, now)
+            for batch in self.sender.batches(user_ids)
+            for group in group_messages(messages)
+        ]
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT INTO outbox (recipients, messages, retry_key, next_attempt_at, created_at) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+        self._wake.set()
+        return len(rows)
+
+    def _housekeep(self):
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            "UPDATE outbox SET status = 'pending' WHERE status = 'sending' AND claimed_at < ?",
+            (now - self.stale_after,),
+        )
+        conn.execute("DELETE FROM outbox WHERE status = 'sent' AND created_at < ?", (now - self.keep_days * 86400,))
+
+    # 以條件式 UPDATE 認領，多個 worker 同時處理也不會重複送出同一筆
+    def _claim(self):
+        conn = self._conn()
+        now = time.time()
+        due = conn.execute(
+            "SELECT id, recipients, messages, retry_key, attempts FROM outbox"
+            " WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?",
+            (now, self.batch_size),
+        ).fetchall()
+        claimed = []
+        for row in due:
+            cur = conn.execute(
+                "UPDATE outbox SET status = 'sending', claimed_at = ? WHERE id = ? AND status = 'pending'",
+                (now, row[0]),
+            )
+            if cur.rowcount:
+                claimed.append(row)
+        return claimed
+
+    def _is_retryable(self, error):
+        if isinstance(error, ApiException):
+            return error.status in RETRYABLE_STATUS
+        return True  # 連線錯誤、逾時
+
+    def _finish(self, row, error):
+        row_id, _, _, _, attempts = row
+        conn = self._conn()
+        attempts += 1
+        # 409 表示同一個 retry key 已被 LINE 接受過，視為成功
+        if error is None or (isinstance(error, ApiException) and error.status == 409):
+            conn.execute("UPDATE outbox SET status = 'sent', attempts = ? WHERE id = ?", (attempts, row_id))
+            return
+        if attempts >= self.max_attempts or not self._is_retryable(error):
+            print(f"推播佇列第 {row_id} 筆放棄重送: {error}")
+            conn.execute(
+                "UPDATE outbox SET status = 'failed', attempts = ?, last_error = ? WHERE id = ?",
+                (attempts, str(error), row_id),
+            )
+            return
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempts)))
+        conn.execute(
+            "UPDATE outbox SET status = 'pending', attempts = ?, last_error = ?, next_attempt_at = ? WHERE id = ?",
+            (attempts, str(error), time.time() + delay, row_id),
+        )
+
+    def drain_once(self):
+        self._housekeep()
+        rows = self._claim()
+        futures = []
+        for row in rows:
+            futures.append(self.sender.multicast_batch(json.loads(row[1]), json.loads(row[2]), row[3]))
+            time.sleep(1 / self.rate)
+        for row, future in zip(rows, futures):
+            try:
+                future.result()
+                error = None
+            except Exception as e:
+                error = e
+            self._finish(row, error)
+        return len(rows)
+
+    def run(self):
+        while True:
+            try:
+                if self.drain_once():
+                    continue
+            except Exception as e:
+                print(f"推播佇列處理失敗: {e}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True, name="outbox").start()
@@ -0,0 +1,90 @@
+import json
+import os
+import threading
+import time
+
+# --- 本機持久化的參考資料：啟動時讀檔，過期後於背景以 loader 重新下載並以「暫存檔 + 改名」寫回 ---
+class PersistedTable:
+    label = "資料"  # 錯誤訊息中的名稱
+
+    def __init__(self, loader, path, ttl=24 * 60 * 60, retry_after=5 * 60):
+        self.loader = loader
+        self.path = path
+        self.ttl = ttl
+        self.retry_after = retry_after  # 更新失敗後，隔多久才再試
+        self.updated_at = 0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._last_attempt = 0
+        self._load_file()
+
+    # 子類別負責資料本身的轉換：檔案內容 → 記憶體、記憶體 → 檔案內容、loader 結果 → 記憶體
+    def _decode(self, saved):
+        raise NotImplementedError
+
+    def _encode(self):
+        raise NotImplementedError
+
+    def _apply(self, loaded):
+        raise NotImplementedError
+
+    def _load_file(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            self._decode(saved)
+            self.updated_at = saved.get("updated_at", 0)
+        except Exception as e:
+            print(f"讀取{self.label}檔失敗: {e}")
+
+    def _save_file(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"updated_at": self.updated_at, **self._encode()}, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def is_stale(self):
+        return time.time() - self.updated_at > self.ttl
+
+    def refresh(self):
+        # 同一台主機的其他 worker 可能已更新過檔案，先讀檔以免重複下載
+        self._load_file()
+        if not self.is_stale():
+            return True
+        loaded = self.loader()
+        if not loaded:
+            return False
+        self._apply(loaded)
+        self.updated_at = time.time()
+        try:
+            self._save_file()
+        except Exception as e:
+            print(f"寫入{self.label}檔失敗: {e}")
+        return True
+
+    # --- 背景更新：同一時間只會有一個更新執行緒 ---
+    def refresh_async(self):
+        with self._lock:
+            if self._refreshing or time.time() - self._last_attempt < self.retry_after:
+                return
+            self._refreshing = True
+            self._last_attempt = time.time()
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def start(self, interval=60 * 60):
+        def loop():
+            while True:
+                if self.is_stale():
+                    self.refresh_async()
+                time.sleep(interval)
+
+        threading.Thread(target=loop, daemon=True).start()
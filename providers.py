@@ -0,0 +1,257 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date, timedelta
+
+try:
+    import yfinance as yf
+except ImportError:  # 未安裝時 yfinance 供應者視為不可用
+    yf = None
+
+# --- 報價供應者：輸入代碼與日期區間，回傳 {代碼: 最新一筆日線}，欄位一律採 FinMind TaiwanStockPrice 格式 ---
+class QuoteProvider:
+    name = "provider"
+
+    def fetch_quotes(self, codes, start, end):
+        raise NotImplementedError
+
+def latest_by_stock(rows, wanted):
+    latest = {}
+    for row in rows:
+        sid = row.get("stock_id")
+        if sid in wanted and (sid not in latest or row["date"] >= latest[sid]["date"]):
+            latest[sid] = row
+    return latest
+
+# 單檔直接查詢；多檔先以全市場查詢，帳號等級不支援時改為每檔一次區間查詢（併發執行）
+class FinMindProvider(QuoteProvider):
+    name = "finmind"
+
+    def __init__(self, client, fetcher):
+        self.client = client
+        self.fetcher = fetcher
+
+    def fetch_quotes(self, codes, start, end):
+        errors = []
+
+        def fetch_one(code):
+            try:
+                rows = self.client.fetch("TaiwanStockPrice", data_id=code + ".TW", start_date=start, end_date=end)
+            except Exception as e:
+                errors.append(e)
+                raise
+            return latest_by_stock(({**r, "stock_id": code} for r in rows), {code}).get(code)
+
+        if len(codes) == 1:
+            return {codes[0]: fetch_one(codes[0])}
+
+        try:
+            rows = self.client.fetch("TaiwanStockPrice", start_date=start, end_date=end)
+        except Exception as e:
+            print(f"全市場行情查詢失敗: {e}")
+            rows = []
+        snapshot = latest_by_stock(rows, set(codes))
+
+        missing = [code for code in codes if code not in snapshot]
+        for code, row in zip(missing, self.fetcher.map(fetch_one, missing)):
+            if row:
+                snapshot[code] = row
+        if not snapshot and errors:
+            raise errors[0]  # 全部失敗才算供應者錯誤，個別代碼查無資料不算
+        return snapshot
+
+# 上市代碼加 .TW、上櫃加 .TWO；先試 .TW，查無資料再試 .TWO，並記住成功的後綴
+class YFinanceProvider(QuoteProvider):
+    name = "yfinance"
+
+    def __init__(self, fetcher):
+        self.fetcher = fetcher
+        self._suffix = {}
+
+    def _history(self, symbol, start, end):
+        # yfinance 的 end 不含當天
+        end = (date.fromisoformat(end) + timedelta(days=1)).isoformat()
+        frame = yf.Ticker(symbol).history(start=start, end=end, auto_adjust=False, raise_errors=True)
+        frame = frame.dropna(subset=["Close"])
+        if frame.empty:
+            return None
+        day, bar = frame.index[-1], frame.iloc[-1]
+        return {
+            "date": day.strftime("%Y-%m-%d"),
+            "stock_id": symbol.split(".")[0],
+            "open": round(float(bar["Open"]), 2),
+            "max": round(float(bar["High"]), 2),
+            "min": round(float(bar["Low"]), 2),
+            "close": round(float(bar["Close"]), 2),
+            "Trading_Volume": int(bar["Volume"]),
+        }
+
+    def fetch_quotes(self, codes, start, end):
+        if yf is None:
+            raise RuntimeError("未安裝 yfinance")
+        errors = []
+
+        def fetch_one(code):
+            suffixes = [self._suffix[code]] if code in self._suffix else [".TW", ".TWO"]
+            for suffix in suffixes:
+                try:
+                    row = self._history(code + suffix, start, end)
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                if row:
+                    self._suffix[code] = suffix
+                    return row
+            return None
+
+        rows = dict(zip(codes, self.fetcher.map(fetch_one, codes)))
+        snapshot = {code: row for code, row in rows.items() if row}
+        if not snapshot and errors:
+            raise errors[0]
+        return snapshot
+
+# --- 供應者統計：最近 N 次呼叫的延遲與成功失敗次數（單檔與多檔查詢分開統計，延遲分布差異很大） ---
+class ProviderStats:
+    def __init__(self, window=200):
+        self.latencies = deque(maxlen=window)
+        self.successes = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def record(self, latency, ok):
+        with self._lock:
+            if ok:
+                self.successes += 1
+                self.latencies.append(latency)
+            else:
+                self.errors += 1
+
+    def percentile(self, q):
+        with self._lock:
+            samples = sorted(self.latencies)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q / 100 * len(samples)))]
+
+    def snapshot(self):
+        p50, p95 = self.percentile(50), self.percentile(95)
+        return {
+            "successes": self.successes,
+            "errors": self.errors,
+            "p50_ms": None if p50 is None else round(p50 * 1000),
+            "p95_ms": None if p95 is None else round(p95 * 1000),
+        }
+
+# --- 斷路器：連續失敗達門檻即開路，冷卻後放行一次試探，成功才恢復 ---
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=60):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record(self, ok):
+        with self._lock:
+            self._probing = False
+            if ok:
+                self.failures = 0
+                self.opened_at = None
+            else:
+                self.failures += 1
+                if self.failures >= self.failure_threshold or self.opened_at is not None:
+                    self.opened_at = time.monotonic()
+
+# --- 報價路由：依序選擇斷路器放行的供應者；主要供應者超過自身 p95 仍未回應時，同時向備援送出對沖請求 ---
+# 執行緒池需容納「同時呼叫數 × 供應者數」，否則對沖請求會排在主要請求後面，反而更慢
+class QuoteRouter:
+    KINDS = ("single", "batch")
+
+    def __init__(self, providers, max_workers=16, min_samples=20, failure_threshold=5, reset_timeout=60):
+        self.providers = providers
+        self.min_samples = min_samples  # 樣本不足時不對沖，避免以不準的 p95 重複打上游
+        self.stats = {(p.name, kind): ProviderStats() for p in providers for kind in self.KINDS}
+        self.breakers = {p.name: CircuitBreaker(failure_threshold, reset_timeout) for p in providers}
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="quote")
+
+    @staticmethod
+    def _kind(codes):
+        return "single" if len(codes) == 1 else "batch"
+
+    def _call(self, provider, codes, start, end):
+        stats = self.stats[(provider.name, self._kind(codes))]
+        began = time.monotonic()
+        try:
+            result = provider.fetch_quotes(codes, start, end)
+        except Exception:
+            stats.record(time.monotonic() - began, False)
+            self.breakers[provider.name].record(False)
+            raise
+        stats.record(time.monotonic() - began, True)
+        self.breakers[provider.name].record(True)
+        return result
+
+    def _hedge_after(self, provider, codes):
+        stats = self.stats[(provider.name, self._kind(codes))]
+        if len(stats.latencies) < self.min_samples:
+            return None
+        return stats.percentile(95)
+
+    # 依序找出下一個斷路器放行的供應者（半開狀態的放行只在真的要呼叫時才取得）
+    def _next(self, remaining):
+        while remaining:
+            provider = remaining.pop(0)
+            if self.breakers[provider.name].allow():
+                return provider
+        return None
+
+    def fetch_quotes(self, codes, start, end):
+        remaining = list(self.providers)
+        primary = self._next(remaining)
+        if primary is None:
+            raise RuntimeError("所有報價來源暫時無法使用")
+        pending = {self.executor.submit(self._call, primary, codes, start, end)}
+        hedge_after = self._hedge_after(primary, codes)
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=hedge_after, return_when=FIRST_COMPLETED)
+            hedge_after = None
+            for future in done:
+                try:
+                    return future.result()
+                except Exception as e:
+                    error = e
+            # 主要供應者失敗或超過 p95 仍未回應：交給下一個備援，先回來的結果為準
+            backup = self._next(remaining)
+            if backup:
+                pending.add(self.executor.submit(self._call, backup, codes, start, end))
+        raise error
+
+    def status(self):
+        return {
+            p.name: {
+                "state": self.breakers[p.name].state,
+                **{kind: self.stats[(p.name, kind)].snapshot() for kind in self.KINDS},
+            }
+            for p in self.providers
+        }
@@ -0,0 +1,95 @@
+import threading
+from concurrent.futures import Future
+from datetime import datetime, time as dt_time
+
+import pytz
+
+from cache_backend import MemoryBackend
+
+TW = pytz.timezone("Asia/Taipei")
+MARKET_CLOSE = dt_time(13, 30)
+INTRADAY_TTL = 60  # 盤中或當日收盤價尚未公布：短暫快取
+CLOSED_TTL = 6 * 60 * 60  # 收盤後資料已確定：長時間快取
+
+# --- 依市場時段決定快取時間 ---
+def market_ttl(session, row, now=None):
+    now = now or datetime.now(TW)
+    if row is None or row.get("date", "") < session:
+        return INTRADAY_TTL
+    if now.strftime("%Y-%m-%d") == session and now.time() < MARKET_CLOSE:
+        return INTRADAY_TTL
+    return CLOSED_TTL
+
+# --- 報價快取：以 (stock_id, 交易日) 為鍵，資料放在可替換的後端，同時間的相同查詢只打一次上游 ---
+class QuoteCache:
+    def __init__(self, backend=None, ttl=market_ttl, wait_timeout=60):
+        self.backend = backend or MemoryBackend()
+        self.ttl = ttl
+        self.wait_timeout = wait_timeout
+        self._inflight = {}  # (code, session) -> Future
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(code, session):
+        return f"quote:{code}:{session}"
+
+    def _store(self, session, rows):
+        by_ttl = {}
+        for code, row in rows.items():
+            by_ttl.setdefault(self.ttl(session, row), {})[self._key(code, session)] = {"row": row}
+        for ttl, items in by_ttl.items():
+            self.backend.set_many(items, ttl)
+
+    # 由外部（例如盤中輪詢）直接寫入最新報價，供其他 worker 共用
+    def put_many(self, session, rows):
+        try:
+            self._store(session, rows)
+        except Exception as e:
+            print(f"寫入報價快取失敗: {e}")
+
+    def get_many(self, codes, session, loader):
+        result, waiting, mine = {}, {}, []
+        try:
+            cached = self.backend.get_many([self._key(code, session) for code in codes])
+        except Exception as e:
+            print(f"讀取報價快取失敗: {e}")
+            cached = {}
+        with self._lock:
+            for code in codes:
+                key = (code, session)
+                hit = cached.get(self._key(code, session))
+                if hit is not None:
+                    result[code] = hit["row"]
+                elif key in self._inflight:
+                    waiting[code] = self._inflight[key]
+                else:
+                    self._inflight[key] = Future()
+                    mine.append(code)
+
+        if mine:
+            try:
+                loaded = loader(mine)
+                failed = False
+            except Exception as e:
+                print(f"報價查詢失敗: {e}")
+                loaded, failed = {}, True
+            rows = {code: loaded.get(code) for code in mine}
+            if not failed:
+                try:
+                    self._store(session, rows)
+                except Exception as e:
+                    print(f"寫入報價快取失敗: {e}")
+            with self._lock:
+                for code in mine:
+                    self._inflight.pop((code, session)).set_result(rows[code])
+            result.update(rows)
+
+        for code, future in waiting.items():
+            try:
+                result[code] = future.result(timeout=self.wait_timeout)
+            except Exception:
+                result[code] = None
+        return {code: row for code, row in result.items() if row is not None}
+
+    def get(self, code, session, loader):
+        return self.get_many([code], session, loader).get(code)
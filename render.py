@@ -0,0 +1,85 @@
+import copy
+from functools import lru_cache
+
+TEXT_LIMIT = 5000  # LINE 文字訊息長度上限
+MESSAGES_PER_REQUEST = 5  # 每次 reply / push / multicast 最多 5 則訊息
+ALT_TEXT_LIMIT = 400
+ROWS_PER_BUBBLE = 12
+BUBBLES_PER_CAROUSEL = 8  # 控制單則 carousel 在 50KB 限制內
+
+# --- 文字訊息：以報價為單位逐段累積，超過上限才換下一則，不會把一檔切成兩半 ---
+def iter_text_messages(blocks, sep="\n\n", limit=TEXT_LIMIT):
+    current = ""
+    for block in blocks:
+        while len(block) > limit:  # 單段本身就超長時只能硬切
+            if current:
+                yield current
+                current = ""
+            yield block[:limit]
+            block = block[limit:]
+        candidate = f"{current}{sep}{block}" if current else block
+        if len(candidate) > limit:
+            yield current
+            candidate = block
+        current = candidate
+    if current:
+        yield current
+
+def group_messages(messages, size=MESSAGES_PER_REQUEST):
+    messages = list(messages)
+    return [messages[i:i + size] for i in range(0, len(messages), size)]
+
+# --- Flex 表格：外框樣板只建一次，每列依內容快取 ---
+BUBBLE_TEMPLATE = {
+    "type": "bubble",
+    "size": "mega",
+    "header": {
+        "type": "box",
+        "layout": "vertical",
+        "paddingAll": "12px",
+        "contents": [{"type": "text", "text": "", "weight": "bold", "size": "sm", "wrap": True}],
+    },
+    "body": {"type": "box", "layout": "vertical", "spacing": "sm", "paddingAll": "12px", "contents": []},
+}
+
+@lru_cache(maxsize=4096)
+def _flex_row(code, name, close, date):
+    return {
+        "type": "box",
+        "layout": "horizontal",
+        "contents": [
+            {"type": "text", "text": f"{code} {name}".strip(), "size": "xs", "flex": 5, "wrap": True},
+            {"type": "text", "text": close, "size": "xs", "flex": 3, "align": "end", "weight": "bold"},
+            {"type": "text", "text": date[5:] if date else "-", "size": "xxs", "flex": 2, "align": "end", "color": "#888888"},
+        ],
+    }
+
+def _bubble(title, rows):
+    bubble = copy.deepcopy(BUBBLE_TEMPLATE)
+    bubble["header"]["contents"][0]["text"] = title
+    bubble["body"]["contents"] = list(rows)  # 列元件唯讀共用，不需複製
+    return bubble
+
+# quotes 為 [(代碼, 名稱, row 或 None)]；每滿一個 carousel 就產出一則 Flex 訊息
+def iter_flex_messages(title, quotes, alt_text):
+    bubbles, rows = [], []
+
+    def flush_carousel():
+        message = {"type": "flex", "altText": alt_text[:ALT_TEXT_LIMIT], "contents": {"type": "carousel", "contents": bubbles[:]}}
+        bubbles.clear()
+        return message
+
+    for code, name, row in quotes:
+        if row:
+            rows.append(_flex_row(code, name, str(row["close"]), row["date"]))
+        else:
+            rows.append(_flex_row(code, name, "無資料", ""))
+        if len(rows) == ROWS_PER_BUBBLE:
+            bubbles.append(_bubble(title, rows))
+            rows = []
+            if len(bubbles) == BUBBLES_PER_CAROUSEL:
+                yield flush_carousel()
+    if rows:
+        bubbles.append(_bubble(title, rows))
+    if bubbles:
+        yield flush_carousel()
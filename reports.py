@@ -0,0 +1,35 @@
+import threading
+from concurrent.futures import Future
+
+# --- 預先產生排程報表：時段到達前先抓資料並組好訊息，到點只需送出 ---
+class ReportPipeline:
+    def __init__(self, build, max_wait=30, keep=8):
+        self.build = build  # build(slot) 回傳完整訊息內容
+        self.max_wait = max_wait  # 到點時若仍在準備中，最多再等幾秒
+        self.keep = keep
+        self._slots = {}  # slot -> Future
+        self._lock = threading.Lock()
+
+    def prepare(self, slot):
+        with self._lock:
+            if slot in self._slots:
+                return
+            future = Future()
+            self._slots[slot] = future
+            for old in sorted(self._slots)[:-self.keep]:
+                self._slots.pop(old).cancel()
+        try:
+            future.set_result(self.build(slot))
+        except Exception as e:
+            print(f"預先產生報表失敗（{slot}）: {e}")
+            future.set_exception(e)
+
+    def take(self, slot):
+        with self._lock:
+            future = self._slots.pop(slot, None)
+        if future is not None:
+            try:
+                return future.result(timeout=self.max_wait)
+            except Exception:
+                pass
+        return self.build(slot)
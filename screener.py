@@ -0,0 +1,140 @@
+import os
+import re
+import threading
+import warnings
+
+import numpy as np
+
+WINDOW = 250  # 約 52 週的交易日數
+VOLUME_WINDOW = 20
+MIN_VOLUME = 500_000  # 爆量篩選排除成交量過小（股）的冷門股
+STOCK_CODE = re.compile(r"\d{4}")  # 上市櫃普通股（另含少數四碼 ETF）
+FIELDS = {"close": "close", "high": "max", "volume": "Trading_Volume"}
+
+# 篩選條件：名稱 → (說明, 預設門檻)
+SCREENS = {
+    "爆量": ("成交量 ≥ 20 日均量 × {:g} 倍", 2.0),
+    "新高": ("創 52 週新高", None),
+    "漲幅": ("漲幅 ≥ {:g}%", 5.0),
+    "跌幅": ("跌幅 ≥ {:g}%", 5.0),
+}
+
+# --- 全市場日線快照：代碼 × 交易日的二維陣列，存成單一 .npz 檔；各 worker 依檔案時間自動重新載入 ---
+class MarketSnapshot:
+    def __init__(self, path, window=WINDOW):
+        self.path = path
+        self.window = window
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._set(np.empty(0, "U6"), np.empty(0, "datetime64[D]"), *(np.empty((0, 0)) for _ in FIELDS))
+        self._reload()
+
+    # 更新表格時一併算好各檔的滾動統計，篩選時只剩向量化比較
+    def _set(self, codes, dates, close, high, volume):
+        self.codes, self.dates = codes, dates
+        self.close, self.high, self.volume = close, high, volume
+        n = len(dates)
+        with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+            warnings.simplefilter("ignore", RuntimeWarning)  # 全為 NaN 的列（停牌、新上市）
+            last_close = close[:, -1] if n else np.empty(0)
+            prev_close = close[:, -2] if n > 1 else np.full(len(codes), np.nan)
+            prior_high = high[:, :-1]
+            self.stats = {
+                "close": last_close,
+                "change": (last_close - prev_close) / prev_close * 100,
+                "volume": volume[:, -1] if n else np.empty(0),
+                "avg_volume": np.nanmean(volume[:, -VOLUME_WINDOW - 1:-1], axis=1) if n > 1 else np.full(len(codes), np.nan),
+                "high": high[:, -1] if n else np.empty(0),
+                "prior_high": np.nanmax(prior_high, axis=1) if n > 1 else np.full(len(codes), np.nan),
+                # 新高須有接近完整的一年資料，避免新上市股票每天都算新高
+                "full_year": (np.sum(~np.isnan(prior_high), axis=1) >= 0.9 * (self.window - 1)) if n > 1 else np.zeros(len(codes), bool),
+            }
+
+    def _reload(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except FileNotFoundError:
+            return
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            try:
+                with np.load(self.path) as data:
+                    self._set(data["codes"], data["dates"], data["close"], data["high"], data["volume"])
+                self._mtime = mtime
+            except (OSError, ValueError, KeyError) as e:
+                print(f"讀取全市場快照失敗: {e}")
+
+    def _save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, codes=self.codes, dates=self.dates, close=self.close, high=self.high, volume=self.volume)
+        os.replace(tmp, self.path)
+        self._mtime = os.path.getmtime(self.path)
+
+    def latest_date(self):
+        self._reload()
+        return self.dates[-1] if len(self.dates) else None
+
+    def has_date(self, day):
+        self._reload()
+        return np.datetime64(day, "D") in self.dates
+
+    # days: {日期: 該日全市場 FinMind TaiwanStockPrice rows}；合併後只保留最近 window 個交易日
+    def update(self, days):
+        self._reload()
+        with self._lock:
+            new_dates = np.array(sorted(days), dtype="datetime64[D]")
+            dates = np.union1d(self.dates, new_dates)[-self.window:]
+            new_codes = {r["stock_id"] for rows in days.values() for r in rows if STOCK_CODE.fullmatch(str(r.get("stock_id", "")))}
+            codes = np.union1d(self.codes, np.array(sorted(new_codes), dtype="U6"))
+            tables = {name: np.full((len(codes), len(dates)), np.nan) for name in FIELDS}
+
+            # 舊資料整塊搬到新的列、欄位置
+            keep = np.isin(self.dates, dates)
+            if keep.any() and len(self.codes):
+                rows = np.searchsorted(codes, self.codes)[:, None]
+                cols = np.searchsorted(dates, self.dates[keep])[None, :]
+                for name in FIELDS:
+                    tables[name][rows, cols] = getattr(self, name)[:, keep]
+
+            for day, day_rows in days.items():
+                day = np.datetime64(day, "D")
+                if day not in dates:
+                    continue
+                day_rows = [r for r in day_rows if STOCK_CODE.fullmatch(str(r.get("stock_id", "")))]
+                if not day_rows:
+                    continue
+                rows = np.searchsorted(codes, np.array([r["stock_id"] for r in day_rows], dtype="U6"))
+                col = np.searchsorted(dates, day)
+                for name, field in FIELDS.items():
+                    tables[name][rows, col] = np.array([r.get(field, np.nan) for r in day_rows], dtype=float)
+
+            self._set(codes, dates, tables["close"], tables["high"], tables["volume"])
+            self._save()
+
+    # 回傳符合條件的 (代碼, 收盤價, 漲跌幅%, 指標值)，依指標由大到小排序
+    def screen(self, kind, threshold=None):
+        self._reload()
+        stats = self.stats
+        if threshold is None:
+            threshold = SCREENS[kind][1]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            if kind == "爆量":
+                metric = stats["volume"] / stats["avg_volume"]
+                mask = (metric >= threshold) & (stats["volume"] >= MIN_VOLUME)
+            elif kind == "新高":
+                metric = stats["change"]
+                mask = stats["full_year"] & (stats["high"] > stats["prior_high"])
+            elif kind == "漲幅":
+                metric = stats["change"]
+                mask = metric >= threshold
+            elif kind == "跌幅":
+                metric = -stats["change"]
+                mask = metric >= threshold
+            else:
+                raise KeyError(kind)
+        mask &= ~np.isnan(stats["close"])
+        idx = np.flatnonzero(mask)
+        idx = idx[np.argsort(-metric[idx], kind="stable")]
+        return [(str(self.codes[i]), float(stats["close"][i]), float(stats["change"][i]), float(metric[i])) for i in idx]
@@ -0,0 +1,24 @@
+from persisted import PersistedTable
+
+# --- 股票名稱表：整張 TaiwanStockInfo 只下載一次，常駐記憶體並寫入本機檔案 ---
+class StockNameRegistry(PersistedTable):
+    label = "股票名稱"
+
+    def __init__(self, loader, path, ttl=24 * 60 * 60, retry_after=5 * 60):
+        self.names = {}  # loader 回傳 {代碼: 名稱}
+        super().__init__(loader, path, ttl, retry_after)
+
+    def _decode(self, saved):
+        self.names = saved.get("names", {})
+
+    def _encode(self):
+        return {"names": self.names}
+
+    def _apply(self, names):
+        self.names = names
+
+    # --- 查詢不會等待網路：尚未載入時回傳空字串並觸發背景更新 ---
+    def get(self, code, default=""):
+        if self.is_stale():
+            self.refresh_async()
+        return self.names.get(code, default)
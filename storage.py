@@ -0,0 +1,41 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # 非 POSIX 平台只會有單一行程，只靠執行緒鎖即可
+    fcntl = None
+
+# --- 共用 SQLite 連線：每個執行緒一條連線（sqlite3 連線不可跨執行緒），開啟 WAL 讓多個 worker 同時讀寫 ---
+class ThreadLocalSQLite:
+    def __init__(self, path, pragmas=("journal_mode=WAL",), timeout=5):
+        self.path = path
+        self.pragmas = pragmas
+        self.timeout = timeout
+        self._local = threading.local()
+
+    # 呼叫物件本身即取得目前執行緒的連線：self._conn = ThreadLocalSQLite(path)；self._conn().execute(...)
+    def __call__(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            for pragma in self.pragmas:
+                conn.execute(f"PRAGMA {pragma}")
+            self._local.conn = conn
+        return conn
+
+# --- 跨行程檔案鎖：同一台主機的多個 gunicorn worker 修改同一組檔案時互斥 ---
+@contextmanager
+def file_lock(path):
+    if fcntl is None:
+        yield
+        return
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
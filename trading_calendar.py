@@ -0,0 +1,65 @@
+import bisect
+import os
+from datetime import date as date_cls, timedelta
+
+from persisted import PersistedTable
+
+# --- 證交所休市日：每行一個日期，# 之後為註解 ---
+def load_holidays(path):
+    if not os.path.exists(path):
+        return set()
+    holidays = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                holidays.add(date_cls.fromisoformat(line))
+    return holidays
+
+# --- 台股交易日曆：排序過的交易日清單，以二分搜尋回答「X 日（含）以前最後一個交易日」 ---
+class TradingCalendar(PersistedTable):
+    label = "交易日曆"
+
+    def __init__(self, loader, path, ttl=24 * 60 * 60, retry_after=5 * 60, holidays=()):
+        self.dates = []  # loader 回傳交易日（datetime.date）清單
+        self.holidays = set(holidays)  # 日曆尚未涵蓋的日期以週末與休市日推估
+        super().__init__(loader, path, ttl, retry_after)
+
+    def _decode(self, saved):
+        self.dates = sorted(date_cls.fromisoformat(d) for d in saved.get("dates", []))
+
+    def _encode(self):
+        return {"dates": [d.isoformat() for d in self.dates]}
+
+    def _apply(self, dates):
+        self.dates = sorted(set(dates))
+
+    # --- 日曆尚未涵蓋的日期（例如還沒更新到今天、連假期間），以週一至週五扣除休市日推估 ---
+    def _last_open_day(self, day):
+        while day.weekday() >= 5 or day in self.holidays:
+            day -= timedelta(days=1)
+        return day
+
+    def last_known(self):
+        return self.dates[-1] if self.dates else None
+
+    def last_session(self, day):
+        if self.is_stale():
+            self.refresh_async()
+        dates = self.dates
+        if not dates or day > dates[-1]:
+            guess = self._last_open_day(day)
+            if not dates or guess > dates[-1]:
+                return guess
+            return dates[-1]
+        i = bisect.bisect_right(dates, day)
+        return dates[i - 1] if i else None
+
+    def previous_session(self, day):
+        return self.last_session(day - timedelta(days=1))
+
+    # 排程的 trading_days_only 與盤中輪詢依此判斷：休市日清單優先，其餘以交易日曆（或推估）為準
+    def is_trading_day(self, day):
+        if day.weekday() >= 5 or day in self.holidays:
+            return False
+        return self.last_session(day) == day
@@ -0,0 +1,77 @@
+import time
+
+from storage import ThreadLocalSQLite
+
+# --- 每位使用者各自的追蹤清單（SQLite）；尚未建立清單的使用者沿用預設清單 ---
+class UserWatchlists:
+    def __init__(self, path):
+        self.path = path
+        self._conn = ThreadLocalSQLite(path)
+        self._conn().executescript("""
+            CREATE TABLE IF NOT EXISTS watch_users (
+                user_id TEXT PRIMARY KEY,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS watchlist (
+                user_id TEXT NOT NULL,
+                stock_id TEXT NOT NULL,
+                added_at REAL NOT NULL,
+                PRIMARY KEY (user_id, stock_id)
+            );
+            CREATE INDEX IF NOT EXISTS watchlist_user ON watchlist (user_id, added_at);
+            CREATE INDEX IF NOT EXISTS watchlist_stock ON watchlist (stock_id);
+        """)
+
+    def has_list(self, user_id):
+        return self._conn().execute("SELECT 1 FROM watch_users WHERE user_id = ?", (user_id,)).fetchone() is not None
+
+    def codes(self, user_id, default=()):
+        if not self.has_list(user_id):
+            return list(default)
+        rows = self._conn().execute(
+            "SELECT stock_id FROM watchlist WHERE user_id = ? ORDER BY added_at, rowid", (user_id,)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    # 第一次修改時先以預設清單建立該使用者的清單
+    def _ensure_list(self, conn, user_id, default):
+        if conn.execute("SELECT 1 FROM watch_users WHERE user_id = ?", (user_id,)).fetchone():
+            return
+        now = time.time()
+        conn.execute("INSERT INTO watch_users (user_id, created_at) VALUES (?, ?)", (user_id, now))
+        conn.executemany(
+            "INSERT OR IGNORE INTO watchlist (user_id, stock_id, added_at) VALUES (?, ?, ?)",
+            [(user_id, code, now + i * 1e-6) for i, code in enumerate(default)],
+        )
+
+    def add(self, user_id, code, default=()):
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._ensure_list(conn, user_id, default)
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO watchlist (user_id, stock_id, added_at) VALUES (?, ?, ?)",
+                (user_id, code, time.time()),
+            )
+            return cur.rowcount > 0
+
+    def remove(self, user_id, code, default=()):
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._ensure_list(conn, user_id, default)
+            cur = conn.execute("DELETE FROM watchlist WHERE user_id = ? AND stock_id = ?", (user_id, code))
+            return cur.rowcount > 0
+
+    def users(self):
+        return [row[0] for row in self._conn().execute("SELECT user_id FROM watch_users")]
+
+    # 推播用：一次取出所有使用者的清單
+    def all_lists(self, user_ids, default=()):
+        lists = {uid: list(default) for uid in user_ids}
+        for uid in self.users():
+            lists[uid] = []
+        rows = self._conn().execute("SELECT user_id, stock_id FROM watchlist ORDER BY user_id, added_at, rowid")
+        for uid, code in rows:
+            lists[uid].append(code)
+        return lists
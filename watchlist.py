@@ -0,0 +1,115 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from storage import file_lock
+
+# --- 追蹤清單：常駐記憶體，檔案變動時才重新載入 ---
+# 新增 / 刪除只附加一行到日誌檔（+代碼 / -代碼），累積到一定數量才以「暫存檔 + 改名」整檔重寫
+class WatchlistStore:
+    def __init__(self, path, check_interval=2, compact_after=200):
+        self.path = path
+        self.journal_path = path + ".log"
+        self.lock_path = path + ".lock"
+        self.check_interval = check_interval  # 最多每隔幾秒檢查一次檔案是否被其他 worker 修改
+        self.compact_after = compact_after
+        self._codes = {}  # 以 dict 保留順序，查詢為 O(1)
+        self._journal_entries = 0
+        self._signature = None
+        self._checked_at = 0
+        self._lock = threading.RLock()
+        with self._lock:
+            self._reload()
+
+    def _file_signature(self):
+        def stat(path):
+            try:
+                st = os.stat(path)
+                return st.st_mtime_ns, st.st_size
+            except FileNotFoundError:
+                return None
+        return stat(self.path), stat(self.journal_path)
+
+    def _reload(self):
+        codes = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                codes = {x.strip(): None for x in f if x.strip()}
+        entries = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "r") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    entries += 1
+                    if line[0] == "+":
+                        codes[line[1:]] = None
+                    elif line[0] == "-":
+                        codes.pop(line[1:], None)
+        self._codes = codes
+        self._journal_entries = entries
+        self._signature = self._file_signature()
+        self._checked_at = time.monotonic()
+
+    def _refresh_if_changed(self):
+        if time.monotonic() - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            self._checked_at = time.monotonic()
+            if self._file_signature() != self._signature:
+                self._reload()
+
+    # --- 跨行程互斥：修改前取得檔案鎖並重新載入最新內容 ---
+    @contextmanager
+    def _locked(self):
+        with self._lock, file_lock(self.lock_path):
+            if self._file_signature() != self._signature:
+                self._reload()
+            yield
+
+    def _append(self, entry):
+        with open(self.journal_path, "a") as f:
+            f.write(entry + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_entries += 1
+        if self._journal_entries >= self.compact_after:
+            self._compact()
+        self._signature = self._file_signature()
+
+    def _compact(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write("\n".join(self._codes))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self._journal_entries = 0
+
+    def codes(self):
+        self._refresh_if_changed()
+        return list(self._codes)
+
+    def __contains__(self, code):
+        self._refresh_if_changed()
+        return code in self._codes
+
+    def add(self, code):
+        with self._locked():
+            if code in self._codes:
+                return False
+            self._codes[code] = None
+            self._append("+" + code)
+            return True
+
+    def remove(self, code):
+        with self._locked():
+            if code not in self._codes:
+                return False
+            self._codes.pop(code)
+            self._append("-" + code)
+            return True